@@ -0,0 +1,229 @@
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class MemoryBudget:
+    """Caps the memory (estimated in bytes) and the number of documents that requests in this process hold at once
+
+    A request is let in with ``admit``, which reserves what it needs up front
+    (its uploads held in memory) and returns a Ticket. Requests that don't
+    fit wait in line for up to ``timeout`` seconds, at most ``max_waiting``
+    of them; the rest are turned away (``admit`` returns None) so the caller
+    can answer with a "busy" status instead of running out of memory.
+
+    A batch then takes room for each document as it starts with
+    ``ticket.acquire`` and gives it back with ``ticket.release`` once the
+    document's output is written, so a batch only moves as fast as its
+    outputs are consumed. Besides the process-wide limits, a ticket has at
+    most ``window`` documents in flight. A ticket with nothing in flight may
+    always start one document, even over budget, so admitted requests can't
+    all end up waiting for each other.
+    """
+
+    def __init__(self, max_bytes, max_documents=0, max_waiting=16, timeout=30.0):
+        self.max_bytes = max_bytes
+        self.max_documents = max_documents
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.bytes = 0
+        self.documents = 0
+        self.peak_bytes = 0
+        self.peak_documents = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def fits(self, nbytes, documents=0):
+        """Whether a request this size could ever be admitted"""
+        return ((not self.max_bytes or nbytes <= self.max_bytes)
+                and (not self.max_documents or documents <= self.max_documents))
+
+    def _has_room(self, nbytes, documents):
+        return ((not self.max_bytes or self.bytes + nbytes <= self.max_bytes)
+                and (not self.max_documents or self.documents + documents <= self.max_documents))
+
+    def _take(self, nbytes, documents):
+        self.bytes += nbytes
+        self.documents += documents
+        self.peak_bytes = max(self.peak_bytes, self.bytes)
+        self.peak_documents = max(self.peak_documents, self.documents)
+
+    def admit(self, nbytes=0, documents=0, window=0, timeout=None):
+        """Reserve room for a new request and return its Ticket, or None if it wasn't admitted in time
+
+        ``timeout`` defaults to the budget's; pass ``float('inf')`` to wait as
+        long as it takes (background work that has nobody to answer to).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._cond:
+            if not self._has_room(nbytes, documents):
+                if self.waiting >= self.max_waiting and timeout != float('inf'):
+                    self.rejected += 1
+                    return None
+                self.waiting += 1
+                try:
+                    admitted = self._cond.wait_for(lambda: self._has_room(nbytes, documents),
+                                                   None if timeout == float('inf') else timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.rejected += 1
+                    return None
+                self.queued += 1
+            self._take(nbytes, documents)
+            self.admitted += 1
+        return Ticket(self, nbytes, documents, window)
+
+    def _acquire(self, ticket, nbytes, documents):
+        with self._cond:
+            def ready():
+                if ticket.closed:
+                    return True
+                if ticket.window and ticket.in_flight + documents > ticket.window:
+                    return False
+                return ticket.in_flight == 0 or self._has_room(nbytes, documents)
+            self._cond.wait_for(ready)
+            if ticket.closed:
+                return False
+            self._take(nbytes, documents)
+            ticket.bytes += nbytes
+            ticket.documents += documents
+            ticket.in_flight += documents
+        return True
+
+    def _release(self, ticket, nbytes, documents, in_flight):
+        with self._cond:
+            nbytes = min(nbytes, ticket.bytes)
+            documents = min(documents, ticket.documents)
+            ticket.bytes -= nbytes
+            ticket.documents -= documents
+            ticket.in_flight = max(0, ticket.in_flight - in_flight)
+            self.bytes -= nbytes
+            self.documents -= documents
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "bytes": self.bytes,
+                "documents": self.documents,
+                "peak_bytes": self.peak_bytes,
+                "peak_documents": self.peak_documents,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+            }
+
+
+class Ticket:
+    """The part of a MemoryBudget one request holds; ``close()`` gives back whatever is left"""
+
+    def __init__(self, budget, nbytes, documents, window):
+        self.budget = budget
+        self.bytes = nbytes
+        self.documents = documents
+        self.window = window
+        self.in_flight = 0
+        self.closed = False
+
+    def acquire(self, nbytes, documents=1):
+        """Wait for room to start ``documents`` more; returns False if the ticket was closed meanwhile"""
+        return self.budget._acquire(self, nbytes, documents)
+
+    def release(self, nbytes, documents=1):
+        """Give back what a finished document held"""
+        self.budget._release(self, nbytes, documents, documents)
+
+    def close(self):
+        with self.budget._cond:
+            if self.closed:
+                return
+            self.closed = True
+        self.budget._release(self, self.bytes, self.documents, self.in_flight)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where it can't be read"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is not None:
+        # Only the peak is available here (kilobytes on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    return None
+
+
+class _Window:
+    __slots__ = ('start', 'peak')
+
+    def __init__(self, rss):
+        self.start = rss
+        self.peak = rss
+
+
+class RssMonitor:
+    """Samples this process's RSS every ``interval`` seconds while anything is being tracked
+
+    ``track()`` yields a window whose ``peak`` is the highest RSS seen while
+    the block ran. RSS is per process, so concurrent batches see each other's
+    memory too.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self._windows = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    @contextmanager
+    def track(self):
+        window = _Window(current_rss())
+        if window.start is None:
+            yield window
+            return
+        with self._lock:
+            self._windows.add(window)
+            # Threads don't survive a fork, so a new process starts its own sampler
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._sample, name='rss-monitor', daemon=True)
+                self._thread.start()
+        try:
+            yield window
+        finally:
+            rss = current_rss()
+            with self._lock:
+                self._windows.discard(window)
+                window.peak = max(window.peak, rss or 0)
+
+    def _sample(self):
+        while True:
+            rss = current_rss()
+            with self._lock:
+                if not self._windows:
+                    self._thread = None
+                    return
+                for window in self._windows:
+                    window.peak = max(window.peak, rss)
+            time.sleep(self.interval)
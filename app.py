@@ -1,43 +1,292 @@
 import os
-import fitz  
-import requests
-from flask import Flask, render_template, request, send_file
-import pdfkit
+from flask import Flask, render_template, request, send_file, jsonify, url_for, Response, stream_with_context
 from io import BytesIO
 import json
-import re
+import time
+import importlib
 import zipfile
 from datetime import datetime
 from dotenv import load_dotenv
 import platform
 from jinja2 import Template
-from docxtpl import DocxTemplate
-import tempfile
+from pipeline import Stage, run_pipeline
+from extraction_cache import ExtractionCache
+from jobs import JobQueue
+from pdf_renderer import WkhtmltopdfRenderer, StoryRenderer
+from zip_stream import stream_zip
+from template_registry import TemplateRegistry
+from docx_renderer import DocxRenderer
+from heuristic_extractor import extract_resume_fields
+from pdf_extractor import extract_pdf
+from gemini_batch import GeminiBatcher, format_batch_resumes, map_batch_results
+from gemini_client import GeminiClient
+from metrics import Metrics, Trace, gauge_lines
+from prompt_text import prepare_prompt_text
+from json_repair import repair_json, conform_to_schema, JSONRepairError
+from dedupe import BatchDeduper, DuplicateIndex, text_hash
+from uploads import Upload, spool_upload, stream_size, close_uploads, purge_stale_uploads
+from admission import MemoryBudget, RssMonitor, current_rss
+from keyword_matcher import KeywordMatcher, SoftSkillMatcher, load_soft_skill_taxonomy
+from werkzeug.datastructures import FileStorage
 
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size for batch processing
 
-# Replace this path with where wkhtmltopdf is installed on your system
+# Where wkhtmltopdf is installed; it's only looked up when the first PDF is rendered
 if platform.system() == "Windows":
-    PDFKIT_CONFIG = pdfkit.configuration(wkhtmltopdf=r'C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe')
+    app.config['WKHTMLTOPDF_PATH'] = os.environ.get("WKHTMLTOPDF_PATH", r'C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe')
 else:
-    PDFKIT_CONFIG = pdfkit.configuration(wkhtmltopdf='/usr/bin/wkhtmltopdf')
+    app.config['WKHTMLTOPDF_PATH'] = os.environ.get("WKHTMLTOPDF_PATH", '/usr/bin/wkhtmltopdf')
+
+PDFKIT_OPTIONS = {
+    'enable-local-file-access': '',
+    'encoding': 'UTF-8',
+    'disable-smart-shrinking': '',
+    'zoom': '1.0',
+    'minimum-font-size': '12'
+}
 
 load_dotenv()
 
 API_KEY = os.environ.get("GEMINI_API_KEY")
 
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Worker counts for each stage of the batch pipeline and the size of the queues between them
+app.config['PIPELINE_EXTRACT_WORKERS'] = int(os.environ.get("PIPELINE_EXTRACT_WORKERS", 2))
+app.config['PIPELINE_LLM_WORKERS'] = int(os.environ.get("PIPELINE_LLM_WORKERS", 8))
+app.config['PIPELINE_RENDER_WORKERS'] = int(os.environ.get("PIPELINE_RENDER_WORKERS", 8))
+app.config['PIPELINE_QUEUE_SIZE'] = int(os.environ.get("PIPELINE_QUEUE_SIZE", 4))
+
+# Concurrent renders are combined into one wkhtmltopdf run of up to PDF_RENDER_BATCH_SIZE documents
+app.config['PDF_RENDER_BATCH_SIZE'] = int(os.environ.get("PDF_RENDER_BATCH_SIZE", 8))
+app.config['PDF_RENDER_BATCH_WAIT'] = float(os.environ.get("PDF_RENDER_BATCH_WAIT", 0.05))
+app.config['PDF_RENDER_PROCESSES'] = int(os.environ.get("PDF_RENDER_PROCESSES", 2))
+
+# How HTML templates become PDFs: "wkhtmltopdf" (pdfkit, a subprocess per render batch) or
+# "pymupdf" (PyMuPDF's Story engine, in-process). PDF_FONT_DIR adds .ttf/.otf fonts to the
+# pymupdf backend, each usable under its file name as a font-family.
+app.config['PDF_RENDER_BACKEND'] = os.environ.get("PDF_RENDER_BACKEND", "wkhtmltopdf")
+app.config['PDF_FONT_DIR'] = os.environ.get("PDF_FONT_DIR", "")
+
+def make_pdf_renderer(backend):
+    """Create the PDF renderer for a PDF_RENDER_BACKEND name"""
+    if backend == "pymupdf":
+        return StoryRenderer(
+            os.path.join('templates', 'CV_Sample_files'),
+            font_dir=app.config['PDF_FONT_DIR'] or None
+        )
+    if backend == "wkhtmltopdf":
+        return WkhtmltopdfRenderer(
+            app.config['WKHTMLTOPDF_PATH'],
+            PDFKIT_OPTIONS,
+            max_batch=app.config['PDF_RENDER_BATCH_SIZE'],
+            max_wait=app.config['PDF_RENDER_BATCH_WAIT'],
+            processes=app.config['PDF_RENDER_PROCESSES']
+        )
+    raise ValueError(f"Unknown PDF_RENDER_BACKEND {backend!r}, expected wkhtmltopdf or pymupdf")
+
+PDF_RENDERER = make_pdf_renderer(app.config['PDF_RENDER_BACKEND'])
+
+# Validated custom templates kept in memory by content hash. Their sources are also stored in
+# TEMPLATE_STORE_FOLDER so template ids work in every worker process; with an empty folder an
+# id only works in the process that handed it out.
+app.config['TEMPLATE_CACHE_SIZE'] = int(os.environ.get("TEMPLATE_CACHE_SIZE", 32))
+app.config['TEMPLATE_STORE_FOLDER'] = os.environ.get("TEMPLATE_STORE_FOLDER", os.path.join('cache', 'templates'))
+app.config['TEMPLATE_STORE_MAX_ENTRIES'] = int(os.environ.get("TEMPLATE_STORE_MAX_ENTRIES", 1000))
+TEMPLATE_REGISTRY = TemplateRegistry(
+    max_entries=app.config['TEMPLATE_CACHE_SIZE'],
+    folder=app.config['TEMPLATE_STORE_FOLDER'] or None,
+    # compile_template is defined further down
+    compile=lambda template_type, filename, source: compile_template(template_type, filename, source),
+    max_stored=app.config['TEMPLATE_STORE_MAX_ENTRIES']
+)
+
+# Background jobs submitted through /jobs
+app.config['JOBS_FOLDER'] = os.environ.get("JOBS_FOLDER", 'jobs')
+app.config['JOB_WORKERS'] = int(os.environ.get("JOB_WORKERS", 2))
+app.config['JOB_RETENTION'] = int(os.environ.get("JOB_RETENTION", 24 * 3600))
+
+# Uploads up to UPLOAD_MEMORY_LIMIT bytes are read straight from memory; larger ones are
+# spooled to unique temp files in UPLOAD_FOLDER and deleted once processed
+app.config['UPLOAD_MEMORY_LIMIT'] = int(os.environ.get("UPLOAD_MEMORY_LIMIT", 2 * 1024 * 1024))
+
+# Admission control: requests in this process hold at most MEMORY_BUDGET_BYTES (uploads kept in
+# memory, plus DOCUMENT_MEMORY_ESTIMATE per document being processed) and MEMORY_BUDGET_DOCUMENTS
+# documents at once, and a batch has at most BATCH_MAX_INFLIGHT documents between upload and
+# written output. Requests that don't fit wait up to ADMISSION_QUEUE_TIMEOUT seconds (at most
+# ADMISSION_MAX_QUEUED of them) and then get a 503; ones too big for the whole budget get a 413.
+app.config['MEMORY_BUDGET_BYTES'] = int(os.environ.get("MEMORY_BUDGET_BYTES", 512 * 1024 * 1024))
+app.config['MEMORY_BUDGET_DOCUMENTS'] = int(os.environ.get("MEMORY_BUDGET_DOCUMENTS", 48))
+app.config['DOCUMENT_MEMORY_ESTIMATE'] = int(os.environ.get("DOCUMENT_MEMORY_ESTIMATE", 4 * 1024 * 1024))
+app.config['BATCH_MAX_INFLIGHT'] = int(os.environ.get("BATCH_MAX_INFLIGHT", 16))
+app.config['ADMISSION_QUEUE_TIMEOUT'] = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 30))
+app.config['ADMISSION_MAX_QUEUED'] = int(os.environ.get("ADMISSION_MAX_QUEUED", 16))
+
+MEMORY_BUDGET = MemoryBudget(
+    app.config['MEMORY_BUDGET_BYTES'],
+    max_documents=app.config['MEMORY_BUDGET_DOCUMENTS'],
+    max_waiting=app.config['ADMISSION_MAX_QUEUED'],
+    timeout=app.config['ADMISSION_QUEUE_TIMEOUT']
+)
+RSS_MONITOR = RssMonitor()
+
+# PDF, DOCX and HTTP libraries are imported on first use. Set PRELOAD_ENGINES=1 to import them
+# in init_runtime instead, e.g. in the gunicorn master so forked workers start with them loaded.
+app.config['PRELOAD_ENGINES'] = os.environ.get("PRELOAD_ENGINES", "0") == "1"
+
+GEMINI_MODEL = "gemini-2.0-flash"
+
+# HTTP client for the AI API: timeouts, retries on 429/5xx and a requests-per-minute limit (0
+# disables it). The limit is kept in GEMINI_RATE_LIMIT_PATH and shared by every worker process
+# using that file; with an empty path each process gets the whole limit to itself.
+# GEMINI_API_BASE can point at a local stub server.
+app.config['GEMINI_API_BASE'] = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+app.config['GEMINI_CONNECT_TIMEOUT'] = float(os.environ.get("GEMINI_CONNECT_TIMEOUT", 10))
+app.config['GEMINI_READ_TIMEOUT'] = float(os.environ.get("GEMINI_READ_TIMEOUT", 120))
+app.config['GEMINI_MAX_RETRIES'] = int(os.environ.get("GEMINI_MAX_RETRIES", 4))
+app.config['GEMINI_RATE_LIMIT_RPM'] = int(os.environ.get("GEMINI_RATE_LIMIT_RPM", 0))
+app.config['GEMINI_RATE_LIMIT_BURST'] = int(os.environ.get("GEMINI_RATE_LIMIT_BURST", 5))
+app.config['GEMINI_RATE_LIMIT_PATH'] = os.environ.get("GEMINI_RATE_LIMIT_PATH", os.path.join('cache', 'rate_limit.sqlite3'))
 
-def extract_text_from_pdf(filepath):
-    text = ""
-    doc = fitz.open(filepath)
-    for page in doc:
-        text += page.get_text()  # type: ignore
-    doc.close()
-    return text.strip()
+GEMINI_CLIENT = GeminiClient(
+    app.config['GEMINI_API_BASE'],
+    API_KEY,
+    connect_timeout=app.config['GEMINI_CONNECT_TIMEOUT'],
+    read_timeout=app.config['GEMINI_READ_TIMEOUT'],
+    max_retries=app.config['GEMINI_MAX_RETRIES'],
+    requests_per_minute=app.config['GEMINI_RATE_LIMIT_RPM'],
+    burst=app.config['GEMINI_RATE_LIMIT_BURST'],
+    pool_size=app.config['PIPELINE_LLM_WORKERS'],
+    limiter_path=app.config['GEMINI_RATE_LIMIT_PATH']
+)
+
+# Limits on how much of an uploaded PDF is read, and processes used for long documents
+app.config['PDF_MAX_PAGES'] = int(os.environ.get("PDF_MAX_PAGES", 20))
+app.config['PDF_MAX_CHARS'] = int(os.environ.get("PDF_MAX_CHARS", 60000))
+app.config['PDF_EXTRACT_PROCESSES'] = int(os.environ.get("PDF_EXTRACT_PROCESSES", 1))
+
+# Optionally extract well-structured resumes locally; only low-confidence ones go to the AI API
+app.config['HEURISTIC_EXTRACTION_ENABLED'] = os.environ.get("HEURISTIC_EXTRACTION_ENABLED", "0") == "1"
+app.config['HEURISTIC_MIN_CONFIDENCE'] = float(os.environ.get("HEURISTIC_MIN_CONFIDENCE", 0.85))
+
+# Optional JSON file replacing the built-in soft skill keywords used by infer_soft_skills
+app.config['SOFT_SKILLS_TAXONOMY'] = os.environ.get("SOFT_SKILLS_TAXONOMY", "")
+
+if app.config['SOFT_SKILLS_TAXONOMY']:
+    SOFT_SKILL_MATCHER = SoftSkillMatcher(*load_soft_skill_taxonomy(app.config['SOFT_SKILLS_TAXONOMY']))
+else:
+    SOFT_SKILL_MATCHER = SoftSkillMatcher()
+
+# Resume text is normalized (repeated headers/footers, page numbers, boilerplate and extra
+# whitespace removed) and trimmed to PROMPT_MAX_TOKENS estimated tokens before it goes to the AI API
+app.config['PROMPT_NORMALIZE'] = os.environ.get("PROMPT_NORMALIZE", "1") == "1"
+app.config['PROMPT_MAX_TOKENS'] = int(os.environ.get("PROMPT_MAX_TOKENS", 6000))
+
+# Resumes extracted at about the same time are sent to the AI API together, up to
+# GEMINI_BATCH_SIZE resumes and GEMINI_BATCH_MAX_TOKENS estimated input tokens per call
+app.config['GEMINI_BATCH_SIZE'] = int(os.environ.get("GEMINI_BATCH_SIZE", 4))
+app.config['GEMINI_BATCH_MAX_TOKENS'] = int(os.environ.get("GEMINI_BATCH_MAX_TOKENS", 24000))
+app.config['GEMINI_BATCH_WAIT'] = float(os.environ.get("GEMINI_BATCH_WAIT", 0.1))
+app.config['GEMINI_BATCH_WORKERS'] = int(os.environ.get("GEMINI_BATCH_WORKERS", 4))
+
+# Cache of AI extraction results so re-processing the same resume skips the API
+app.config['EXTRACTION_CACHE_ENABLED'] = os.environ.get("EXTRACTION_CACHE_ENABLED", "1") == "1"
+app.config['EXTRACTION_CACHE_PATH'] = os.environ.get("EXTRACTION_CACHE_PATH", os.path.join('cache', 'extractions.sqlite3'))
+app.config['EXTRACTION_CACHE_MAX_BYTES'] = int(os.environ.get("EXTRACTION_CACHE_MAX_BYTES", 100 * 1024 * 1024))
+app.config['EXTRACTION_CACHE_TTL'] = int(os.environ.get("EXTRACTION_CACHE_TTL", 30 * 24 * 3600))
+
+EXTRACTION_CACHE = None
+if app.config['EXTRACTION_CACHE_ENABLED']:
+    EXTRACTION_CACHE = ExtractionCache(
+        app.config['EXTRACTION_CACHE_PATH'],
+        max_bytes=app.config['EXTRACTION_CACHE_MAX_BYTES'],
+        ttl=app.config['EXTRACTION_CACHE_TTL']
+    )
+
+# Duplicate resumes (same file, or the same text) are processed once per batch, and an index of
+# processed files lets exact copies in later batches skip extraction. DEDUPE_INDEX_PATH=""
+# disables the index.
+app.config['DEDUPE_ENABLED'] = os.environ.get("DEDUPE_ENABLED", "1") == "1"
+app.config['DEDUPE_INDEX_PATH'] = os.environ.get("DEDUPE_INDEX_PATH", os.path.join('cache', 'duplicates.sqlite3'))
+app.config['DEDUPE_INDEX_MAX_ENTRIES'] = int(os.environ.get("DEDUPE_INDEX_MAX_ENTRIES", 50000))
+app.config['DEDUPE_INDEX_TTL'] = int(os.environ.get("DEDUPE_INDEX_TTL", 30 * 24 * 3600))
+
+# Per-stage timings and counters, served on /metrics. Set METRICS_TRACE_LOG to a file
+# path (or "-" for stdout) to also log every resume's stage timings as a JSON line.
+app.config['METRICS_TRACE_LOG'] = os.environ.get("METRICS_TRACE_LOG", "")
+
+METRICS = Metrics(trace_log=app.config['METRICS_TRACE_LOG'])
+METRICS.counter("resumes_processed_total", "Resumes processed, by outcome")
+METRICS.counter("resume_input_bytes_total", "Bytes of uploaded resume PDFs")
+METRICS.counter("resume_pages_total", "PDF pages read from uploaded resumes")
+METRICS.counter("resume_text_chars_total", "Characters of text extracted from resumes")
+METRICS.counter("resume_extractions_total", "Structured data extractions, by source")
+METRICS.counter("resume_output_bytes_total", "Bytes of formatted resumes, by format")
+METRICS.counter("gemini_prompt_bytes_total", "Bytes of prompts sent to the AI API")
+METRICS.counter("prompt_tokens_total", "Estimated resume text tokens sent to the AI API")
+METRICS.counter("prompt_tokens_saved_total", "Estimated resume text tokens removed by prompt preparation")
+METRICS.counter("gemini_response_bytes_total", "Bytes of responses received from the AI API")
+METRICS.counter("gemini_response_repairs_total", "JSON repairs made to AI responses, by kind")
+METRICS.counter("resume_duplicates_total", "Resumes that reused the result of a duplicate, by match")
+METRICS.counter("admission_rejections_total", "Upload requests turned away by admission control, by reason")
+METRICS.histogram("batch_peak_rss_bytes", "Peak RSS of the process while a batch ran",
+                  buckets=tuple(mb * 1024 * 1024 for mb in (128, 256, 512, 1024, 2048, 4096, 8192)))
+
+def collect_component_metrics():
+    """Exposition lines for the Gemini client, extraction cache, duplicate index and admission counters"""
+    lines = []
+    for name, value in GEMINI_CLIENT.metrics().items():
+        if name.endswith("_max_seconds"):
+            lines += gauge_lines(f"gemini_client_{name}", f"Gemini client {name.replace('_', ' ')}", value)
+        else:
+            lines += gauge_lines(f"gemini_client_{name}_total", f"Gemini client {name.replace('_', ' ')}", value, "counter")
+    if EXTRACTION_CACHE is not None:
+        stats = EXTRACTION_CACHE.stats()
+        lines += gauge_lines("extraction_cache_hits_total", "Extraction cache hits", stats["hits"], "counter")
+        lines += gauge_lines("extraction_cache_misses_total", "Extraction cache misses", stats["misses"], "counter")
+        lines += gauge_lines("extraction_cache_entries", "Entries in the extraction cache", stats["entries"])
+        lines += gauge_lines("extraction_cache_bytes", "Size of the extraction cache", stats["bytes"])
+    if DUPLICATE_INDEX is not None:
+        stats = DUPLICATE_INDEX.stats()
+        lines += gauge_lines("duplicate_index_exact_hits_total", "Duplicate index hits on the file hash", stats["hits"], "counter")
+        lines += gauge_lines("duplicate_index_misses_total", "Duplicate index misses", stats["misses"], "counter")
+        lines += gauge_lines("duplicate_index_entries", "Resumes in the duplicate index", stats["entries"])
+    stats = MEMORY_BUDGET.stats()
+    lines += gauge_lines("admission_inflight_bytes", "Estimated memory held by admitted requests", stats["bytes"])
+    lines += gauge_lines("admission_inflight_documents", "Documents being processed", stats["documents"])
+    lines += gauge_lines("admission_peak_bytes", "Highest admission_inflight_bytes so far", stats["peak_bytes"])
+    lines += gauge_lines("admission_peak_documents", "Highest admission_inflight_documents so far", stats["peak_documents"])
+    lines += gauge_lines("admission_waiting_requests", "Requests waiting for memory budget", stats["waiting"])
+    lines += gauge_lines("admission_admitted_total", "Requests admitted", stats["admitted"], "counter")
+    lines += gauge_lines("admission_queued_total", "Requests admitted after waiting", stats["queued"], "counter")
+    rss = current_rss()
+    if rss is not None:
+        lines += gauge_lines("process_resident_memory_bytes", "Resident memory of this process", rss)
+    return lines
+
+METRICS.add_collector(collect_component_metrics)
+
+def extract_content_from_pdf(source, name=None):
+    """Extract the text and, when the local extractor is enabled, the layout lines of a PDF path or bytes"""
+    if isinstance(source, str):
+        size, name = os.path.getsize(source), name or os.path.basename(source)
+    else:
+        size = len(source)
+    with METRICS.timer("pdf_extract"):
+        content = extract_pdf(
+            source,
+            with_layout=app.config['HEURISTIC_EXTRACTION_ENABLED'],
+            max_pages=app.config['PDF_MAX_PAGES'],
+            max_chars=app.config['PDF_MAX_CHARS'],
+            workers=app.config['PDF_EXTRACT_PROCESSES']
+        )
+    METRICS.inc("resume_input_bytes_total", size)
+    METRICS.inc("resume_pages_total", min(content.page_count, app.config['PDF_MAX_PAGES'] or content.page_count))
+    METRICS.inc("resume_text_chars_total", len(content.text))
+    if content.truncated:
+        print(f"Only the first {app.config['PDF_MAX_PAGES']} pages / {app.config['PDF_MAX_CHARS']} characters of {name} were used")
+    return content.text.strip(), content.lines or None
 
 def process_custom_template(template_file):
     """Process uploaded custom template and return template object"""
@@ -84,13 +333,12 @@ def process_custom_template(template_file):
 def process_docx_template(template_file):
     """Process uploaded DOCX template and return template object"""
     try:
-        # Save the uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as temp_file:
-            template_file.save(temp_file.name)
-            temp_path = temp_file.name
+        # Load the template straight from the uploaded bytes
+        template_bytes = template_file.read()
+        template_file.seek(0)  # Reset file pointer for potential reuse
         
-        # Create DocxTemplate object
-        doc = DocxTemplate(temp_path)
+        # Create the DOCX renderer
+        doc = DocxRenderer(template_bytes)
         
         # Basic validation - check if template has basic resume variables
         test_data = {
@@ -117,44 +365,65 @@ def process_docx_template(template_file):
             }
             doc.render(test_context)
         except Exception as e:
-            # Clean up temp file
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
             return None, f"DOCX template validation failed: {str(e)}"
         
-        return doc, temp_path
+        return doc, None
         
     except Exception as e:
-        # Clean up temp file if it exists
-        try:
-            if 'temp_path' in locals():
-                os.unlink(temp_path)
-        except:
-            pass
         return None, f"Error processing DOCX template: {str(e)}"
 
-def clean_response_for_json(raw):
-    raw = raw.replace("```json", "").replace("```", "").strip()
-    raw = raw.replace('\r', '').replace('\t', ' ')
-    
-    # Remove invalid control characters
-    raw = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', raw)
-    
-    # Remove invalid escape characters
-    raw = re.sub(r'\\(?!["\\/bfnrtu])', '', raw)
-    
-    # Remove trailing commas
-    raw = re.sub(r',(\s*[}\]])', r'\1', raw)
-    
-    # Fix smart quotes and apostrophes
-    raw = raw.replace('"', '"').replace('"', '"').replace(''', "'").replace(''', "'")
-    
-    # Remove any leading/trailing whitespace and newlines
-    raw = raw.strip()
-    
-    return raw
+def load_custom_template(template_file):
+    """Process an uploaded HTML or DOCX template based on its extension
+
+    Templates already seen (by content hash) are reused without being
+    validated again. Returns (template, template_type, template_id, error).
+    """
+    file_extension = template_file.filename.lower()
+    if file_extension.endswith(('.html', '.htm')):
+        template_type = "html"
+    elif file_extension.endswith('.docx'):
+        template_type = "docx"
+    else:
+        return None, None, None, "Please upload a valid HTML (.html/.htm) or DOCX (.docx) template file."
+
+    source = template_file.read()
+    template_file.seek(0)  # Reset file pointer for potential reuse
+    entry = TEMPLATE_REGISTRY.get(TemplateRegistry.make_id(template_type, source))
+    if entry is None:
+        custom_template, template_error = compile_template(template_type, template_file.filename, source)
+        if template_error:
+            return None, template_type, None, template_error
+        entry = TEMPLATE_REGISTRY.add(template_type, template_file.filename, source, custom_template)
+
+    return entry.compiled, template_type, entry.template_id, None
+
+def compile_template(template_type, filename, source):
+    """Validate and compile a template's bytes; returns (template, error)"""
+    template_file = FileStorage(stream=BytesIO(source), filename=filename)
+    if template_type == "html":
+        return process_custom_template(template_file)
+    return process_docx_template(template_file)
+
+def get_registered_template(template_id):
+    """Look up a template registered by an earlier upload
+
+    Returns (template, template_type, error).
+    """
+    entry = TEMPLATE_REGISTRY.get(template_id)
+    if entry is None:
+        return None, None, "Template not found. Please upload the template file again."
+    return entry.compiled, entry.template_type, None
+
+def clean_response_for_json(raw, schema=None):
+    """Parse the AI response into JSON, repairing it and fitting it to the schema; returns (data, repairs)"""
+    data, repairs = repair_json(raw)
+    if schema is not None:
+        data = conform_to_schema(data, schema, repairs)
+    # Counted rather than printed: most responses need some (usually just stripping a code fence).
+    # Schema fixes start with the JSON path, which is left out to keep the labels few.
+    for repair in repairs:
+        METRICS.inc("gemini_response_repairs_total", kind=repair.split(': ', 1)[-1])
+    return data, repairs
 
 def infer_professional_title(data):
     # Use most recent work experience with both title and company if available
@@ -204,18 +473,13 @@ def infer_profile_summary(data):
         if edu.get("degree"):
             years = f", {edu['degree']} graduate"
     # Try to infer industry/technologies from work/project descriptions
-    techs = set()
-    for job in data.get("workExperience", []):
-        desc = (job.get("description") or "").lower()
-        for skill in skills:
-            if skill and skill.lower() in desc:
-                techs.add(skill)
-    for proj in data.get("projects", []):
-        desc = (proj.get("description") or "").lower()
-        for skill in skills:
-            if skill and skill.lower() in desc:
-                techs.add(skill)
-    techs_str = ", ".join([t for t in list(techs)[:3] if t])
+    # (one scan over all descriptions; \0 keeps matches from spanning two of them)
+    descriptions = "\0".join(
+        (item.get("description") or "") for item in data.get("workExperience", []) + data.get("projects", [])
+    )
+    found = KeywordMatcher(skills).find(descriptions)
+    techs = [skill for skill in dict.fromkeys(skills) if skill and skill.lower() in found]
+    techs_str = ", ".join([t for t in techs[:3] if t])
     summary = f"I am {title}{years}"
     if techs_str:
         summary += f" with hands-on experience in {techs_str}"
@@ -225,41 +489,17 @@ def infer_profile_summary(data):
     return summary
 
 def infer_soft_skills(data):
-    soft_skills = set()
     # Combine all text sources
     achievements = " ".join([a for a in data.get("achievements", []) if a])
     projects = " ".join([p.get("description", "") or "" for p in data.get("projects", [])])
     work = " ".join([(w.get("description", "") or "") for w in data.get("workExperience", [])])
     job_titles = " ".join([(w.get("title", "") or "") for w in data.get("workExperience", [])])
     edu_text = " ".join([(e.get("degree", "") or "") + " " + (e.get("major", "") or "") for e in data.get("education", [])])
-    text = f"{achievements} {projects} {work} {job_titles} {edu_text}".lower()
+    text = f"{achievements} {projects} {work} {job_titles} {edu_text}"
     # Keyword-based inference
-    if any(word in text for word in ["lead", "led", "team", "collaborate", "mentored", "managed"]):
-        soft_skills.add("Leadership")
-        soft_skills.add("Collaboration")
-    if any(word in text for word in ["presented", "communicated", "reported", "wrote", "documented"]):
-        soft_skills.add("Presentation")
-        soft_skills.add("Communication")
-    if any(word in text for word in ["deadline", "fast-paced", "timely", "delivered", "prioritize", "organized"]):
-        soft_skills.add("Time Management")
-        soft_skills.add("Adaptability")
-    if any(word in text for word in ["analyze", "solved", "troubleshoot", "problem", "critical thinking"]):
-        soft_skills.add("Problem Solving")
-        soft_skills.add("Analytical Thinking")
-    if not soft_skills:
-        soft_skills = {"Teamwork", "Communication", "Problem Solving"}
-    return sorted([s for s in soft_skills if s])
-
-def process_single_resume(filepath, custom_template=None, template_type="html"):
-    """Process a single resume and return the formatted PDF"""
-    try:
-        # Extract text from PDF
-        resume_text = extract_text_from_pdf(filepath)
-        if not resume_text.strip():
-            return None, "Could not extract text from the PDF. Please ensure it's not password protected or corrupted."
+    return SOFT_SKILL_MATCHER.infer(text)
 
-        # Send to AI API
-        prompt = f"""
+RESUME_PROMPT = """
         Extract the following information from the resume text provided below.
         Structure the output as a JSON object with this schema:
         {{
@@ -279,26 +519,223 @@ def process_single_resume(filepath, custom_template=None, template_type="html"):
         \"\"\"{resume_text}\"\"\"
         """
 
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={API_KEY}"
-        payload = {
-            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
-            "generationConfig": {"responseMimeType": "application/json"}
-        }
+RESUME_BATCH_PROMPT = """
+        Extract the following information from each of the resumes provided below.
+        Each resume is wrapped in a <resume index="N"> tag.
+        Structure the output as a JSON array with one object per resume, using this schema for each object:
+        {{
+            "index": 0,
+            "name": "Full Name",
+            "email": "Email Address",
+            "phone": "Phone Number",
+            "linkedin": "LinkedIn Profile URL",
+            "github": "GitHub Profile URL",
+            "education": [{{"degree": "", "major": "", "collegeName": "", "cgpa": "", "startDate": "", "endDate": ""}}],
+            "workExperience": [{{"title": "", "company": "", "location": "", "startDate": "", "endDate": "", "description": ""}}],
+            "projects": [{{"name": "", "description": "", "technologies": "", "link": ""}}],
+            "skills": [],
+            "achievements": [],
+            "otherInfo": ""
+        }}
+        "index" must be the index of the resume the object was extracted from.
+        Resumes:
+        {resumes}
+        """
 
-        res = requests.post(url, json=payload)
-        
-        if res.status_code != 200:
-            return None, f"API Error: {res.status_code} - {res.text}"
-        
-        result_text = res.json()["candidates"][0]["content"]["parts"][0]["text"]
-        cleaned = clean_response_for_json(result_text)
+def _string_fields(*names):
+    return {name: {"type": "STRING"} for name in names}
 
-        try:
-            structured_data = json.loads(cleaned)
-        except json.JSONDecodeError as e:
-            return None, f"JSON parsing error: {e.msg} at line {e.lineno}, column {e.colno}"
+RESUME_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        **_string_fields("name", "email", "phone", "linkedin", "github", "otherInfo"),
+        "education": {"type": "ARRAY", "items": {
+            "type": "OBJECT",
+            "properties": _string_fields("degree", "major", "collegeName", "cgpa", "startDate", "endDate")
+        }},
+        "workExperience": {"type": "ARRAY", "items": {
+            "type": "OBJECT",
+            "properties": _string_fields("title", "company", "location", "startDate", "endDate", "description")
+        }},
+        "projects": {"type": "ARRAY", "items": {
+            "type": "OBJECT",
+            "properties": _string_fields("name", "description", "technologies", "link")
+        }},
+        "skills": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "achievements": {"type": "ARRAY", "items": {"type": "STRING"}}
+    }
+}
+
+RESUME_BATCH_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        **RESUME_RESPONSE_SCHEMA,
+        "properties": {"index": {"type": "INTEGER"}, **RESUME_RESPONSE_SCHEMA["properties"]},
+        "required": ["index"]
+    }
+}
+
+def call_gemini(prompt, response_schema=None):
+    """Send a prompt to the AI API and return the response text"""
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "generationConfig": {"responseMimeType": "application/json"}
+    }
+    if response_schema:
+        payload["generationConfig"]["responseSchema"] = response_schema
+
+    METRICS.inc("gemini_prompt_bytes_total", len(prompt.encode('utf-8')))
+    with METRICS.timer("gemini_request"):
+        response, error = GEMINI_CLIENT.generate_content(GEMINI_MODEL, payload)
+    if error:
+        return None, error
+
+    try:
+        result_text = response["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return None, f"API Error: unexpected response - {json.dumps(response)[:200]}"
+    METRICS.inc("gemini_response_bytes_total", len(result_text.encode('utf-8')))
+    return result_text, None
+
+def request_structured_data(resume_text):
+    """Extract the structured data of one resume with the AI API"""
+    result_text, error = call_gemini(RESUME_PROMPT.format(resume_text=resume_text))
+    if error:
+        return None, error
+
+    try:
+        with METRICS.timer("parse"):
+            structured_data, _ = clean_response_for_json(result_text, RESUME_RESPONSE_SCHEMA)
+    except JSONRepairError as e:
+        return None, f"JSON parsing error: {e}"
+
+    return structured_data, None
+
+def request_structured_data_batch(resume_texts):
+    """Extract the structured data of several resumes with one AI API call
+
+    Returns a list with the data of each resume (None where the response
+    didn't include it) and an error.
+    """
+    prompt = RESUME_BATCH_PROMPT.format(resumes=format_batch_resumes(resume_texts))
+    result_text, error = call_gemini(prompt, RESUME_BATCH_SCHEMA)
+    if error:
+        return None, error
+
+    try:
+        with METRICS.timer("parse"):
+            items, repairs = clean_response_for_json(result_text, RESUME_BATCH_SCHEMA)
+    except JSONRepairError as e:
+        return None, f"JSON parsing error: {e}"
+
+    if "closed truncated output" in repairs and isinstance(items, list):
+        # The last resume was cut off; leave it out so it's retried on its own
+        items = items[:-1]
+
+    return map_batch_results(items, len(resume_texts)), None
+
+def extract_structured_data(resume_text, layout=None, batched=True):
+    """Extract the structured data locally if possible, otherwise send resume text to the AI API
+
+    With ``batched``, the request may be combined with other resumes
+    extracted at about the same time (see GEMINI_BATCHER).
+    """
+    if app.config['HEURISTIC_EXTRACTION_ENABLED']:
+        with METRICS.timer("heuristic"):
+            structured_data, confidence = extract_resume_fields(resume_text, layout)
+        if confidence >= app.config['HEURISTIC_MIN_CONFIDENCE']:
+            print(f"Local extraction accepted (confidence {confidence:.2f})")
+            METRICS.inc("resume_extractions_total", source="heuristic")
+            return structured_data, None
+        print(f"Local extraction confidence {confidence:.2f} too low, using AI API")
 
-        # --- Fallback logic for missing fields ---
+    if app.config['PROMPT_NORMALIZE']:
+        with METRICS.timer("prompt_prep"):
+            prepared = prepare_prompt_text(resume_text, app.config['PROMPT_MAX_TOKENS'])
+        saved = prepared.tokens_before - prepared.tokens_after
+        print(f"Prompt text: {prepared.tokens_after} tokens, {saved} saved"
+              f"{' (truncated to budget)' if prepared.truncated else ''}")
+        METRICS.inc("prompt_tokens_total", prepared.tokens_after)
+        METRICS.inc("prompt_tokens_saved_total", saved)
+        resume_text = prepared.text
+
+    cache_key = None
+    if EXTRACTION_CACHE is not None:
+        cache_key = ExtractionCache.make_key(resume_text, GEMINI_MODEL, RESUME_PROMPT)
+        with METRICS.timer("cache_lookup"):
+            cached = EXTRACTION_CACHE.get(cache_key)
+        if cached is not None:
+            METRICS.inc("resume_extractions_total", source="cache")
+            return cached, None
+
+    # Includes time spent waiting for a batch to fill and for the batch's response
+    with METRICS.timer("llm"):
+        if batched and GEMINI_BATCHER is not None:
+            structured_data, error = GEMINI_BATCHER.extract(resume_text)
+        else:
+            structured_data, error = request_structured_data(resume_text)
+    if error:
+        return None, error
+    METRICS.inc("resume_extractions_total", source="llm")
+
+    if cache_key is not None:
+        EXTRACTION_CACHE.put(cache_key, structured_data)
+
+    return structured_data, None
+
+GEMINI_BATCHER = None
+if app.config['GEMINI_BATCH_SIZE'] > 1:
+    GEMINI_BATCHER = GeminiBatcher(
+        request_structured_data_batch,
+        request_structured_data,
+        max_batch=app.config['GEMINI_BATCH_SIZE'],
+        max_tokens=app.config['GEMINI_BATCH_MAX_TOKENS'],
+        max_wait=app.config['GEMINI_BATCH_WAIT'],
+        workers=app.config['GEMINI_BATCH_WORKERS']
+    )
+
+DUPLICATE_INDEX = None
+if app.config['DEDUPE_ENABLED'] and app.config['DEDUPE_INDEX_PATH']:
+    DUPLICATE_INDEX = DuplicateIndex(
+        app.config['DEDUPE_INDEX_PATH'],
+        # Everything that changes what extraction returns for the same file
+        version=ExtractionCache.make_key(
+            "", GEMINI_MODEL, RESUME_PROMPT,
+            app.config['PDF_MAX_PAGES'], app.config['PDF_MAX_CHARS'],
+            app.config['PROMPT_NORMALIZE'], app.config['PROMPT_MAX_TOKENS'],
+            app.config['HEURISTIC_EXTRACTION_ENABLED'], app.config['HEURISTIC_MIN_CONFIDENCE']
+        ),
+        ttl=app.config['DEDUPE_INDEX_TTL'],
+        max_entries=app.config['DEDUPE_INDEX_MAX_ENTRIES']
+    )
+
+def find_duplicate(sha256):
+    """Return the structured data of an indexed copy of this file, or None"""
+    if DUPLICATE_INDEX is None or not sha256:
+        return None
+    with METRICS.timer("dedupe"):
+        structured_data = DUPLICATE_INDEX.find(sha256)
+    if structured_data is not None:
+        print("Reusing the extraction of a previously processed copy of this file")
+        METRICS.inc("resume_duplicates_total", match="exact")
+    return structured_data
+
+def extract_new_resume(resume_text, layout=None, sha256=None, batched=True):
+    """extract_structured_data, indexing the result by file hash
+
+    Text seen before in another file is reused through the extraction cache.
+    """
+    structured_data, error = extract_structured_data(resume_text, layout, batched)
+    if error:
+        return None, error
+    if DUPLICATE_INDEX is not None:
+        DUPLICATE_INDEX.add(sha256, structured_data)
+    return structured_data, None
+
+def render_resume(structured_data, custom_template=None, template_type="html"):
+    """Fill in missing fields and render the structured data with the selected template"""
+    # --- Fallback logic for missing fields ---
+    with METRICS.timer("fallbacks"):
         # Professional Title
         if not structured_data.get("title"):
             structured_data["title"] = infer_professional_title(structured_data)
@@ -315,43 +752,31 @@ def process_single_resume(filepath, custom_template=None, template_type="html"):
         else:
             generated_soft_skills = structured_data["softSkills"]
 
-        # Generate output based on template type
-        if custom_template:
-            if template_type == "docx":
-                # Use DOCX template
-                try:
-                    # Render the DOCX template
-                    context = {
-                        "data": structured_data,
-                        "generated_profile_summary": generated_profile_summary,
-                        "generated_professional_title": generated_professional_title,
-                        "generated_soft_skills": generated_soft_skills
-                    }
-                    custom_template.render(context)
-                    
-                    # Save the rendered DOCX to a temporary file
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as temp_docx:
-                        custom_template.save(temp_docx.name)
-                        docx_path = temp_docx.name
-                    
-                    # Read the DOCX bytes
-                    with open(docx_path, 'rb') as f:
-                        docx_bytes = f.read()
-                    
-                    # Clean up temporary file
-                    try:
-                        os.unlink(docx_path)
-                    except:
-                        pass
-                    
-                    return docx_bytes, 'docx'
-                    
-                except Exception as e:
-                    return None, f"Error rendering DOCX template: {str(e)}"
-            else:
-                # Use HTML template
-                try:
-                    abs_img_path = os.path.abspath(os.path.join('templates', 'CV_Sample_files')).replace('\\', '/')
+    # Generate output based on template type
+    if custom_template:
+        if template_type == "docx":
+            # Use DOCX template
+            try:
+                # Render the DOCX template
+                context = {
+                    "data": structured_data,
+                    "generated_profile_summary": generated_profile_summary,
+                    "generated_professional_title": generated_professional_title,
+                    "generated_soft_skills": generated_soft_skills
+                }
+                with METRICS.timer("template"):
+                    docx_bytes = custom_template.render(context)
+                METRICS.inc("resume_output_bytes_total", len(docx_bytes), format="docx")
+
+                return (docx_bytes, 'docx'), None
+
+            except Exception as e:
+                return None, f"Error rendering DOCX template: {str(e)}"
+        else:
+            # Use HTML template
+            try:
+                abs_img_path = os.path.abspath(os.path.join('templates', 'CV_Sample_files')).replace('\\', '/')
+                with METRICS.timer("template"):
                     rendered_html = custom_template.render(
                         data=structured_data,
                         abs_img_path=abs_img_path,
@@ -359,28 +784,19 @@ def process_single_resume(filepath, custom_template=None, template_type="html"):
                         generated_professional_title=generated_professional_title,
                         generated_soft_skills=generated_soft_skills
                     )
-                    
-                    options = {
-                        'enable-local-file-access': '',
-                        'encoding': 'UTF-8',
-                        'disable-smart-shrinking': '',
-                        'zoom': '1.0',
-                        'minimum-font-size': '12'
-                    }
-                    pdf_bytes = pdfkit.from_string(
-                        rendered_html, 
-                        False, 
-                        configuration=PDFKIT_CONFIG, 
-                        options=options
-                    )
-                    
-                    return pdf_bytes, None
-                    
-                except Exception as e:
-                    return None, f"Error rendering HTML template: {str(e)}"
-        else:
-            # Use default HTML template
-            abs_img_path = os.path.abspath(os.path.join('templates', 'CV_Sample_files')).replace('\\', '/')
+
+                with METRICS.timer("pdf_render"):
+                    pdf_bytes = PDF_RENDERER.render(rendered_html)
+                METRICS.inc("resume_output_bytes_total", len(pdf_bytes), format="pdf")
+
+                return pdf_bytes, None
+
+            except Exception as e:
+                return None, f"Error rendering HTML template: {str(e)}"
+    else:
+        # Use default HTML template
+        abs_img_path = os.path.abspath(os.path.join('templates', 'CV_Sample_files')).replace('\\', '/')
+        with METRICS.timer("template"):
             rendered_html = render_template(
                 "resume_template.html",
                 data=structured_data,
@@ -389,30 +805,279 @@ def process_single_resume(filepath, custom_template=None, template_type="html"):
                 generated_professional_title=generated_professional_title,
                 generated_soft_skills=generated_soft_skills
             )
-            
-            options = {
-                'enable-local-file-access': '',
-                'encoding': 'UTF-8',
-                'disable-smart-shrinking': '',
-                'zoom': '1.0',
-                'minimum-font-size': '12'
-            }
-            pdf_bytes = pdfkit.from_string(
-                rendered_html, 
-                False, 
-                configuration=PDFKIT_CONFIG, 
-                options=options
-            )
-            
-            return pdf_bytes, None
-        
+
+        with METRICS.timer("pdf_render"):
+            pdf_bytes = PDF_RENDERER.render(rendered_html)
+        METRICS.inc("resume_output_bytes_total", len(pdf_bytes), format="pdf")
+
+        return pdf_bytes, None
+
+def finish_resume_trace(trace, error=None):
+    """Count a processed resume and close its trace"""
+    METRICS.inc("resumes_processed_total", outcome="failed" if error else "done")
+    METRICS.finish_trace(trace, error)
+
+def process_single_resume(upload, custom_template=None, template_type="html"):
+    """Process a single resume (an Upload or a file path) and return the formatted PDF"""
+    if not isinstance(upload, Upload):
+        upload = Upload.from_path(upload)
+    trace = Trace(upload.filename)
+    with METRICS.activate(trace):
+        output, error = _process_single_resume(upload, custom_template, template_type)
+        finish_resume_trace(trace, error)
+    return output, error
+
+def _process_single_resume(upload, custom_template, template_type):
+    try:
+        # An exact copy of a resume processed before skips text extraction altogether
+        structured_data = find_duplicate(sha256=upload.sha256)
+        if structured_data is None:
+            # Extract text from PDF
+            resume_text, layout = extract_content_from_pdf(upload.source, upload.filename)
+            if not resume_text.strip():
+                return None, "Could not extract text from the PDF. Please ensure it's not password protected or corrupted."
+
+            # Extract the structured data locally or with the AI API. A single upload has no
+            # other resumes to share a request with, so it doesn't wait GEMINI_BATCH_WAIT for any
+            structured_data, error = extract_new_resume(resume_text, layout, upload.sha256, batched=False)
+            if error:
+                return None, error
+
+        return render_resume(structured_data, custom_template, template_type)
+
     except Exception as e:
         return None, f"Error processing resume: {str(e)}"
 
+def build_batch_stages(custom_template=None, template_type="html", deduper=None):
+    """Build the extract -> AI -> render stages used for batch processing of Uploads
+
+    With a BatchDeduper, resumes in the batch with the same text are extracted
+    and rendered once and share the output.
+    """
+    # Each item carries its Trace from stage to stage, since the stages run on different threads
+    def traced(func, first=False, last=False):
+        def stage(item):
+            if first:
+                trace, value = Trace(item.filename), item
+            else:
+                trace, value = item
+            with METRICS.activate(trace):
+                try:
+                    result, error = func(value)
+                except Exception as e:
+                    finish_resume_trace(trace, str(e))
+                    raise
+                if error:
+                    finish_resume_trace(trace, error)
+                    return None, error
+                if last:
+                    finish_resume_trace(trace)
+                    return result, None
+            return (trace, result), None
+        return stage
+
+    def extract_stage(upload):
+        try:
+            structured_data = find_duplicate(sha256=upload.sha256)
+            if structured_data is not None:
+                return (None, structured_data, None), None
+            resume_text, layout = extract_content_from_pdf(upload.source, upload.filename)
+        finally:
+            # Only the text is needed from here on, so free the upload (and its temp file) now
+            upload.close()
+        if not resume_text.strip():
+            return None, "Could not extract text from the PDF. Please ensure it's not password protected or corrupted."
+        group = None
+        if deduper is not None:
+            with METRICS.timer("dedupe"):
+                group, duplicate = deduper.assign(text_hash(resume_text))
+            if duplicate:
+                print(f"{upload.filename} has the same text as another resume in the batch")
+                METRICS.inc("resume_duplicates_total", match="batch")
+        return ((resume_text, layout, upload.sha256), None, group), None
+
+    def ai_stage(item):
+        content, structured_data, group = item
+        if structured_data is None:
+            if group is not None:
+                structured_data, error = group.run("ai", lambda: extract_new_resume(*content))
+            else:
+                structured_data, error = extract_new_resume(*content)
+            if error:
+                return None, error
+        return (structured_data, group), None
+
+    def render_stage(item):
+        structured_data, group = item
+
+        def render():
+            # render_template needs an app context, which worker threads don't have
+            with app.app_context():
+                return render_resume(structured_data, custom_template, template_type)
+
+        if group is not None:
+            return group.run("render", render)
+        return render()
+
+    return [
+        Stage('extract', traced(extract_stage, first=True), app.config['PIPELINE_EXTRACT_WORKERS']),
+        Stage('ai', traced(ai_stage), app.config['PIPELINE_LLM_WORKERS']),
+        Stage('render', traced(render_stage, last=True), app.config['PIPELINE_RENDER_WORKERS']),
+    ]
+
+def run_batch(uploads, custom_template=None, template_type="html", ticket=None):
+    """Run uploads through the batch pipeline and yield (index, output, error) for each
+
+    Exact copies (same SHA-256) never enter the pipeline: each is yielded right
+    after the upload it duplicates, with the same output. Uploads with the same
+    text share their output through the pipeline's BatchDeduper.
+
+    Each upload enters the pipeline only once ``ticket`` (a MEMORY_BUDGET
+    admission, taken here if not given) has room for it, and gives the room
+    back when the caller asks for the next output, i.e. once this one is
+    written. The uploads' in-memory bytes, if the ticket was admitted with
+    them, are given back at the same time.
+    """
+    own_ticket = ticket is None
+    if own_ticket:
+        ticket = MEMORY_BUDGET.admit(window=app.config['BATCH_MAX_INFLIGHT'], timeout=float('inf'))
+    estimate = app.config['DOCUMENT_MEMORY_ESTIMATE']
+    held = [upload.size if upload.data is not None else 0 for upload in uploads]
+
+    unique, copies, deduper = list(range(len(uploads))), {}, None
+    if app.config['DEDUPE_ENABLED']:
+        unique, first_seen = [], {}
+        for i, upload in enumerate(uploads):
+            if upload.sha256 and upload.sha256 in first_seen:
+                copies.setdefault(first_seen[upload.sha256], []).append(i)
+                upload.close()
+                ticket.release(held[i], 0)
+            else:
+                first_seen[upload.sha256] = i
+                unique.append(i)
+        deduper = BatchDeduper()
+
+    def admitted():
+        for i in unique:
+            # Blocks while this batch's window or the process budget is full
+            if not ticket.acquire(estimate):
+                return
+            yield uploads[i]
+
+    stages = build_batch_stages(custom_template, template_type, deduper)
+    with RSS_MONITOR.track() as rss:
+        try:
+            for position, output, error in run_pipeline(admitted(), stages, app.config['PIPELINE_QUEUE_SIZE']):
+                index = unique[position]
+                yield index, output, error
+                for copy in copies.get(index, ()):
+                    print(f"{uploads[copy].filename} is an exact copy of {uploads[index].filename}")
+                    METRICS.inc("resume_duplicates_total", match="exact")
+                    yield copy, output, error
+                ticket.release(estimate + held[index])
+        finally:
+            if own_ticket:
+                ticket.close()
+    if rss.peak is not None:
+        METRICS.observe("batch_peak_rss_bytes", rss.peak)
+        print(f"Batch of {len(uploads)} resumes: peak RSS {rss.peak / 1024 / 1024:.0f} MB "
+              f"(started at {rss.start / 1024 / 1024:.0f} MB)")
+
+def admit_upload_request(files, documents=0):
+    """Reserve MEMORY_BUDGET room for a request's uploads, waiting in line while the server is busy
+
+    Uploads that spool_upload keeps in memory count with their size. Returns
+    (ticket, None, None), or (None, message, status) if the request could
+    never fit in the budget (413) or no room came free in time (503).
+    """
+    upload_bytes = 0
+    for file in files:
+        size = stream_size(file)
+        if size <= app.config['UPLOAD_MEMORY_LIMIT']:
+            upload_bytes += size
+    reserved = upload_bytes + documents * app.config['DOCUMENT_MEMORY_ESTIMATE']
+    # A batch needs room for at least one document on top of its uploads
+    needed = reserved if documents else reserved + app.config['DOCUMENT_MEMORY_ESTIMATE']
+    if not MEMORY_BUDGET.fits(needed, max(documents, 1)):
+        METRICS.inc("admission_rejections_total", reason="too_large")
+        message = (f"This upload needs about {needed / 1024 / 1024:.0f} MB of memory to process, "
+                   f"more than the server allows at once.")
+        if len(files) > 1:
+            message += " Please split it into smaller batches."
+        return None, message, 413
+
+    ticket = MEMORY_BUDGET.admit(reserved, documents, window=app.config['BATCH_MAX_INFLIGHT'])
+    if ticket is None:
+        METRICS.inc("admission_rejections_total", reason="busy")
+        return None, ("The server is busy processing other uploads. Please try again in a minute, "
+                      "or submit the files as a background job."), 503
+    return ticket, None, None
+
+def batch_entry(filename, output, error):
+    """Return the ZIP entry name and contents for one processed resume"""
+    if output:
+        # Add to zip with a clean filename
+        clean_name = os.path.splitext(filename)[0].replace(' ', '_')
+        if isinstance(output, tuple) and output[1] == 'docx':
+            return f"{clean_name}_Formatted.docx", output[0]
+        return f"{clean_name}_Formatted.pdf", output
+    # Add error log to zip
+    return f"{filename}_ERROR.txt", f"Failed to process: {error}"
+
+def process_job(job, report):
+    """Process a queued job and write its PDF, DOCX or ZIP artifact into the job folder"""
+    custom_template = None
+    template_type = "html"
+    job_dir = JOB_QUEUE.job_dir(job["id"])
+
+    if job["template_path"]:
+        with open(job["template_path"], 'rb') as f:
+            template_file = FileStorage(stream=f, filename=os.path.basename(job["template_path"]))
+            custom_template, template_type, _, template_error = load_custom_template(template_file)
+        if template_error:
+            return None, None, template_error
+
+    files = job["files"]
+    uploads = [Upload.from_path(f["path"], f["filename"]) for f in files]
+    results = run_batch(uploads, custom_template, template_type)
+
+    if len(files) == 1:
+        _, output, error = next(results)
+        results.close()
+        if error:
+            report(0, 'failed', error)
+            return None, None, error
+        if isinstance(output, tuple) and output[1] == 'docx':
+            download_name, output = "Formatted_Resume.docx", output[0]
+        else:
+            download_name = "Formatted_Resume.pdf"
+        artifact_path = os.path.join(job_dir, download_name)
+        with open(artifact_path, 'wb') as f:
+            f.write(output)
+        report(0, 'done', output_name=download_name)
+        return artifact_path, download_name, None
+
+    artifact_path = os.path.join(job_dir, "Formatted_Resumes.zip")
+    with zipfile.ZipFile(artifact_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for i, output, error in results:
+            entry_name, entry_data = batch_entry(files[i]["filename"], output, error)
+            zip_file.writestr(entry_name, entry_data)
+            report(i, 'done' if output else 'failed', error, entry_name)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return artifact_path, f"Formatted_Resumes_{timestamp}.zip", None
+
+JOB_QUEUE = JobQueue(
+    app.config['JOBS_FOLDER'],
+    process_job,
+    workers=app.config['JOB_WORKERS'],
+    retention=app.config['JOB_RETENTION']
+)
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
         print("POST request received")
+        ticket = None
         try:
             # Check if files were uploaded
             if 'resume' not in request.files:
@@ -435,113 +1100,204 @@ def index():
             # Process custom template if provided
             custom_template = None
             template_type = "html"
-            template_temp_path = None
+            template_id = None
             
             if custom_template_mode:
-                if 'template' not in request.files:
-                    return render_template('index.html', error="Custom template mode enabled but no template file uploaded.")
-                
-                template_file = request.files['template']
-                if not template_file.filename:
-                    return render_template('index.html', error="No template file selected.")
-                
-                # Check file extension
-                file_extension = template_file.filename.lower()
-                if file_extension.endswith(('.html', '.htm')):
-                    custom_template, template_error = process_custom_template(template_file)
-                    template_type = "html"
-                elif file_extension.endswith('.docx'):
-                    custom_template, template_temp_path = process_docx_template(template_file)
-                    template_type = "docx"
-                    if template_temp_path is None:
-                        template_error = custom_template  # In this case, custom_template contains the error
-                        custom_template = None
-                    else:
-                        template_error = None
+                template_id = request.form.get('template_id')
+                if template_id:
+                    # Reuse a template registered by an earlier upload
+                    custom_template, template_type, template_error = get_registered_template(template_id)
                 else:
-                    return render_template('index.html', error="Please upload a valid HTML (.html/.htm) or DOCX (.docx) template file.")
+                    if 'template' not in request.files:
+                        return render_template('index.html', error="Custom template mode enabled but no template file uploaded.")
+                    
+                    template_file = request.files['template']
+                    if not template_file.filename:
+                        return render_template('index.html', error="No template file selected.")
+                    
+                    custom_template, template_type, template_id, template_error = load_custom_template(template_file)
                 
                 if template_error:
                     return render_template('index.html', error=template_error)
             
             print(f"Processing {len(pdf_files)} PDF files")
-            
+            single = len(pdf_files) == 1 or not batch_mode
+            if single:
+                pdf_files = pdf_files[:1]
+                if not pdf_files[0].filename:
+                    return render_template('index.html', error="Invalid filename.")
+
+            # Wait for room in this process's memory budget, or turn the request away
+            ticket, admission_error, status = admit_upload_request(pdf_files, documents=1 if single else 0)
+            if admission_error:
+                print(f"Request not admitted ({status}): {admission_error}")
+                headers = {'Retry-After': str(max(1, int(app.config['ADMISSION_QUEUE_TIMEOUT'])))} if status == 503 else {}
+                return render_template('index.html', error=admission_error), status, headers
+
             # Single file processing
-            if len(pdf_files) == 1 or not batch_mode:
+            if single:
                 file = pdf_files[0]
-                if not file.filename:
-                    return render_template('index.html', error="Invalid filename.")
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-                file.save(filepath)
-                
-                pdf_bytes, error = process_single_resume(filepath, custom_template, template_type)
+                with ticket:
+                    with spool_upload(file, app.config['UPLOAD_FOLDER'], app.config['UPLOAD_MEMORY_LIMIT']) as upload:
+                        pdf_bytes, error = process_single_resume(upload, custom_template, template_type)
                 if error:
                     return render_template('index.html', error=error)
                 
                 if isinstance(pdf_bytes, tuple) and pdf_bytes[1] == 'docx':
-                    return send_file(BytesIO(pdf_bytes[0]), download_name="Formatted_Resume.docx", as_attachment=True)
+                    response = send_file(BytesIO(pdf_bytes[0]), download_name="Formatted_Resume.docx", as_attachment=True)
                 else:
-                    return send_file(BytesIO(pdf_bytes), download_name="Formatted_Resume.pdf", as_attachment=False)  # type: ignore
+                    response = send_file(BytesIO(pdf_bytes), download_name="Formatted_Resume.pdf", as_attachment=False)  # type: ignore
             
             # Batch processing
             else:
                 print("Starting batch processing...")
-                zip_buffer = BytesIO()
-                with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                items = []
+                try:
+                    for file in pdf_files:
+                        items.append(spool_upload(file, app.config['UPLOAD_FOLDER'], app.config['UPLOAD_MEMORY_LIMIT']))
+                except Exception:
+                    close_uploads(items)
+                    raise
+
+                def release():
+                    close_uploads(items)
+                    ticket.close()
+
+                filenames = [file.filename for file in pdf_files]
+
+                def generate_entries():
                     successful_count = 0
                     failed_count = 0
-                    
-                    for i, file in enumerate(pdf_files):
-                        if not file.filename:
-                            continue
-                        print(f"Processing file {i+1}/{len(pdf_files)}: {file.filename}")
-                        
-                        # Save file temporarily
-                        filepath = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-                        file.save(filepath)
-                        
-                        # Process the resume with custom template if provided
-                        pdf_bytes, error = process_single_resume(filepath, custom_template, template_type)
-                        
-                        if pdf_bytes:
-                            # Add to zip with a clean filename
-                            clean_name = os.path.splitext(file.filename)[0].replace(' ', '_')
-                            zip_file.writestr(f"{clean_name}_Formatted.pdf", pdf_bytes)  # type: ignore
+                    for i, output, error in run_batch(items, custom_template, template_type, ticket):
+                        print(f"Processed file {i+1}/{len(filenames)}: {filenames[i]}")
+                        if output:
                             successful_count += 1
                         else:
-                            # Add error log to zip
-                            zip_file.writestr(f"{file.filename}_ERROR.txt", f"Failed to process: {error}")  # type: ignore
                             failed_count += 1
-                        
-                        # Clean up temporary file
-                        try:
-                            os.remove(filepath)
-                        except:
-                            pass
-                
-                zip_buffer.seek(0)
+                        yield batch_entry(filenames[i], output, error)
+                    print(f"Batch finished: {successful_count} succeeded, {failed_count} failed")
+
+                # Stream each entry to the client as soon as it is ready instead of building the ZIP in memory
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                return send_file(
-                    zip_buffer, 
-                    download_name=f"Formatted_Resumes_{timestamp}.zip", 
-                    as_attachment=True,
-                    mimetype='application/zip'
+                response = Response(
+                    stream_with_context(stream_zip(generate_entries())),
+                    mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename=Formatted_Resumes_{timestamp}.zip'}
                 )
+                # Uploads are closed as they're extracted and documents released as they're written;
+                # this catches any left if the client goes away
+                response.call_on_close(release)
+
+            # Let clients reuse the template with template_id instead of uploading it again
+            if template_id:
+                response.headers['X-Template-Id'] = template_id
+            return response
 
         except Exception as e:
             print(f"Unexpected error: {str(e)}")
+            if ticket is not None:
+                ticket.close()
             return render_template("index.html", error=f"Unexpected error: {str(e)}")
-        finally:
-            # Clean up DOCX template temporary file if it exists
-            if template_temp_path and os.path.exists(template_temp_path):
-                try:
-                    os.unlink(template_temp_path)
-                except:
-                    pass
 
     print("GET request received")
     return render_template("index.html")
 
+@app.route('/templates', methods=['POST'])
+def register_template():
+    """Validate an HTML or DOCX template and return an id that can be used instead of uploading it again"""
+    template_file = request.files.get('template')
+    if template_file is None or not template_file.filename:
+        return jsonify(error="No template file selected."), 400
+
+    _, template_type, template_id, template_error = load_custom_template(template_file)
+    if template_error:
+        return jsonify(error=template_error), 400
+    return jsonify(template_id=template_id, template_type=template_type)
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue uploaded resumes for background processing and return the job id"""
+    if 'resume' not in request.files:
+        return jsonify(error="No files were uploaded."), 400
+
+    files = request.files.getlist('resume')
+    pdf_files = [file for file in files if file.filename and file.filename.lower().endswith('.pdf')]
+    if not pdf_files:
+        return jsonify(error="Please upload valid PDF files."), 400
+
+    template_file = None
+    if request.form.get('custom_template') == 'on':
+        template_id = request.form.get('template_id')
+        if template_id:
+            entry = TEMPLATE_REGISTRY.get(template_id)
+            if entry is None:
+                return jsonify(error="Template not found. Please upload the template file again."), 404
+            template_file = FileStorage(stream=BytesIO(entry.source), filename=entry.filename)
+        else:
+            template_file = request.files.get('template')
+            if template_file is None or not template_file.filename:
+                return jsonify(error="Custom template mode enabled but no template file uploaded."), 400
+            if not template_file.filename.lower().endswith(('.html', '.htm', '.docx')):
+                return jsonify(error="Please upload a valid HTML (.html/.htm) or DOCX (.docx) template file."), 400
+
+    batch_mode = request.form.get('batch_mode') == 'on'
+    if not batch_mode:
+        pdf_files = pdf_files[:1]
+
+    JOB_QUEUE.start()
+    job_id = JOB_QUEUE.submit(pdf_files, template_file, {"batch_mode": batch_mode})
+    print(f"Job {job_id}: queued {len(pdf_files)} files")
+    return jsonify(
+        job_id=job_id,
+        status_url=url_for('job_status', job_id=job_id),
+        download_url=url_for('download_job', job_id=job_id)
+    ), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report the progress of a job and each of its files"""
+    JOB_QUEUE.start()
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        return jsonify(error="Job not found."), 404
+
+    files = [
+        {
+            "filename": f["filename"],
+            "status": f["status"],
+            "error": f["error"],
+            "output": f["output_name"]
+        }
+        for f in job["files"]
+    ]
+    status = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "error": job["error"],
+        "total": len(files),
+        "completed": sum(1 for f in files if f["status"] in ('done', 'failed')),
+        "failed": sum(1 for f in files if f["status"] == 'failed'),
+        "files": files
+    }
+    if job["status"] == 'done':
+        status["download_url"] = url_for('download_job', job_id=job_id)
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/download')
+def download_job(job_id):
+    """Download the finished artifact of a job"""
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        return jsonify(error="Job not found."), 404
+    if job["status"] != 'done':
+        return jsonify(error=f"Job is {job['status']}.", status=job["status"]), 409
+    return send_file(os.path.abspath(job["artifact_path"]), download_name=job["download_name"], as_attachment=True)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus-style metrics for this process"""
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/download-sample-template')
 def download_sample_template():
     """Download the sample HTML template"""
@@ -560,10 +1316,31 @@ def download_sample_docx_template():
     except Exception as e:
         return render_template('index.html', error=f"Error downloading template: {str(e)}")
 
-if __name__ == '__main__':
-    port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=False)
+# Modules behind the lazily loaded engines: PDF extraction and splitting, wkhtmltopdf, DOCX
+# templates and the Gemini HTTP client
+ENGINE_MODULES = ["fitz", "pdfkit", "docxtpl", "requests"]
 
+def preload_engines():
+    """Import the engines' libraries and load the PDF renderer now instead of on first use"""
+    started = time.perf_counter()
+    for name in ENGINE_MODULES:
+        importlib.import_module(name)
+    try:
+        PDF_RENDERER.preload()
+    except Exception as e:
+        print(f"PDF renderer is not available yet: {str(e)}")
+    print(f"Engines preloaded in {time.perf_counter() - started:.2f}s")
 
+def init_runtime():
+    """Finish starting the module-level app: prepare the upload folder and, with PRELOAD_ENGINES, load the engines"""
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    purge_stale_uploads(app.config['UPLOAD_FOLDER'])
+    if app.config['PRELOAD_ENGINES']:
+        preload_engines()
 
+# `gunicorn app:app` and importing the module get an app that is ready to serve
+init_runtime()
 
+if __name__ == '__main__':
+    port = int(os.environ.get("PORT", 5000))
+    app.run(host="0.0.0.0", port=port, debug=False)
@@ -0,0 +1,519 @@
+"""Benchmark the resume pipeline end to end against a fake Gemini server
+
+Generates synthetic resume PDFs, runs them through the real Flask routes
+(PDF extraction, response cleanup, infer_* fallbacks, template rendering and
+wkhtmltopdf) with a local FakeGeminiServer standing in for the API, and
+reports per-stage and end-to-end latency percentiles, throughput and peak
+RSS for single and batch modes. Each mode runs in a fresh process so RSS
+and caches don't leak between them. The startup mode times cold starts
+instead: importing the app and serving the first resume in a new interpreter.
+The render mode renders the default template for synthetic structured data
+with each PDF backend (wkhtmltopdf and pymupdf by default), each in its own
+process, to compare per-document latency and memory.
+
+    python benchmark.py --resumes 24 --pages 1,2,4 --llm-latency 0.5 --output bench.json
+    python benchmark.py --compare bench.json
+    python benchmark.py --modes startup --startup-runs 10
+    python benchmark.py --modes render --resumes 50
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import zipfile
+import platform
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import fitz
+from fake_gemini import FakeGeminiServer
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+FIRST_NAMES = ["Aarav", "Priya", "Rahul", "Ananya", "Vikram", "Sneha", "Arjun", "Meera", "Karan", "Divya"]
+LAST_NAMES = ["Sharma", "Patel", "Iyer", "Reddy", "Gupta", "Nair", "Singh", "Das", "Mehta", "Rao"]
+COMPANIES = ["Infosys", "TCS", "Wipro", "Flipkart", "Zomato", "Razorpay", "Freshworks", "Swiggy"]
+TITLES = ["Software Engineer", "Data Analyst", "Backend Developer", "ML Engineer", "DevOps Engineer"]
+SKILLS = ["Python", "Java", "SQL", "Flask", "Django", "React", "Docker", "AWS", "Pandas", "Git", "Kubernetes"]
+VERBS = ["Built", "Designed", "Led", "Optimized", "Migrated", "Automated", "Maintained"]
+OBJECTS = ["a REST API serving 2M requests a day", "the reporting pipeline", "CI/CD with GitHub Actions",
+           "a recommendation service", "legacy batch jobs to Kubernetes", "the customer onboarding flow"]
+
+LINES_PER_PAGE = 55
+
+# A single-resume request succeeded only if it returned one of these; errors are the HTML form
+OUTPUT_MIMETYPES = ('application/pdf', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+
+
+def make_resume_text(rng, pages):
+    """Return the lines of a synthetic resume long enough to fill ``pages`` pages"""
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    lines = [
+        name,
+        f"{name.lower().replace(' ', '.')}@example.com | +91 98{rng.randint(10000000, 99999999)}",
+        f"linkedin.com/in/{name.lower().replace(' ', '-')} | github.com/{name.split()[0].lower()}",
+        "",
+        "EDUCATION",
+        f"B.Tech in Computer Science, Example Institute of Technology   {rng.randint(2010, 2018)} - {rng.randint(2019, 2022)}",
+        f"CGPA: {rng.uniform(6.5, 9.8):.2f}",
+        "",
+        "SKILLS",
+        ", ".join(rng.sample(SKILLS, 6)),
+        "",
+        "EXPERIENCE",
+    ]
+    year = 2024
+    while len(lines) < pages * LINES_PER_PAGE - 8:
+        lines.append(f"{rng.choice(TITLES)}, {rng.choice(COMPANIES)}   {year - 2} - {year}")
+        for _ in range(rng.randint(3, 6)):
+            lines.append(f"- {rng.choice(VERBS)} {rng.choice(OBJECTS)} using {rng.choice(SKILLS)}")
+        lines.append("")
+        year -= 2
+    lines += ["PROJECTS", f"Resume Parser - {rng.choice(VERBS)} {rng.choice(OBJECTS)}",
+              "", "ACHIEVEMENTS", "Winner, Smart India Hackathon"]
+    return lines
+
+
+def make_resume_pdf(rng, pages):
+    """Return the bytes of a synthetic resume PDF with about ``pages`` pages"""
+    lines = make_resume_text(rng, pages)
+    doc = fitz.open()
+    for start in range(0, len(lines), LINES_PER_PAGE):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((50, 50), "\n".join(lines[start:start + LINES_PER_PAGE]), fontsize=10)
+    data = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return data
+
+
+def make_corpus(count, page_counts, seed):
+    """Return ``count`` (filename, pdf_bytes) pairs cycling through ``page_counts``"""
+    rng = random.Random(seed)
+    return [
+        (f"resume_{i:03d}_{page_counts[i % len(page_counts)]}p.pdf", make_resume_pdf(rng, page_counts[i % len(page_counts)]))
+        for i in range(count)
+    ]
+
+
+def make_resume_data(rng, pages):
+    """Return structured data, as extraction would, for a resume of about ``pages`` pages"""
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    year = 2024
+    jobs = []
+    for _ in range(pages * 3):
+        jobs.append({
+            "title": rng.choice(TITLES),
+            "company": rng.choice(COMPANIES),
+            "location": "Bengaluru",
+            "startDate": str(year - 2),
+            "endDate": str(year),
+            "description": " ".join(f"{rng.choice(VERBS)} {rng.choice(OBJECTS)} using {rng.choice(SKILLS)}."
+                                    for _ in range(rng.randint(3, 6))),
+        })
+        year -= 2
+    return {
+        "name": name,
+        "email": f"{name.lower().replace(' ', '.')}@example.com",
+        "phone": f"+91 98{rng.randint(10000000, 99999999)}",
+        "skills": rng.sample(SKILLS, 6),
+        "education": [{
+            "degree": "B.Tech",
+            "major": "Computer Science",
+            "collegeName": "Example Institute of Technology",
+            "startDate": str(year - 4),
+            "endDate": str(year),
+            "cgpa": f"{rng.uniform(6.5, 9.8):.2f}",
+        }],
+        "workExperience": jobs,
+    }
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile of ``values`` (q between 0 and 100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values):
+    """Count, mean and percentiles of a list of seconds"""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 6),
+        "p50": round(percentile(values, 50), 6),
+        "p90": round(percentile(values, 90), 6),
+        "p95": round(percentile(values, 95), 6),
+        "p99": round(percentile(values, 99), 6),
+        "max": round(max(values), 6),
+    }
+
+
+def peak_rss_mb():
+    """Peak RSS of this process and of its largest finished child, in MB"""
+    if resource is None:
+        return None, None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(own, 1), round(children, 1)
+
+
+def read_traces(path, skip=0):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f.read().splitlines()[skip:] if line.strip()]
+
+
+def stage_summaries(traces):
+    """Per-stage latency summaries from the app's trace log"""
+    stages = {"total": [trace["seconds"] for trace in traces]}
+    for trace in traces:
+        for span in trace["spans"]:
+            stages.setdefault(span["stage"], []).append(span["seconds"])
+    return {stage: summarize(values) for stage, values in sorted(stages.items())}
+
+
+def run_mode(mode, settings):
+    """Run one mode in this (fresh) process and return its results"""
+    work_dir = tempfile.mkdtemp(prefix="resume-bench-")
+    trace_log = os.path.join(work_dir, "traces.jsonl")
+    os.environ.update({
+        "GEMINI_API_BASE": settings["api_base"],
+        "GEMINI_API_KEY": "benchmark",
+        "METRICS_TRACE_LOG": trace_log,
+        "HEURISTIC_EXTRACTION_ENABLED": "1" if settings["heuristic"] else "0",
+        "EXTRACTION_CACHE_ENABLED": "0",
+        "DEDUPE_INDEX_PATH": "",
+        "JOBS_FOLDER": os.path.join(work_dir, "jobs"),
+    })
+    os.environ.update(settings["env"])
+    # The app resolves templates and uploads relative to the working directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    import_started = time.perf_counter()
+    import app as appmod
+    import_seconds = time.perf_counter() - import_started
+    client = appmod.app.test_client()
+
+    corpus = make_corpus(settings["resumes"], settings["pages"], settings["seed"])
+
+    def post(files, batch):
+        data = {'resume': [(io.BytesIO(pdf), name) for name, pdf in files]}
+        if batch:
+            data['batch_mode'] = 'on'
+        started = time.perf_counter()
+        response = client.post('/', data=data, content_type='multipart/form-data')
+        body = response.get_data()
+        elapsed = time.perf_counter() - started
+        expected = ('application/zip',) if batch else OUTPUT_MIMETYPES
+        if response.status_code != 200 or response.mimetype not in expected:
+            return elapsed, len(files), 0
+        if batch:
+            names = zipfile.ZipFile(io.BytesIO(body)).namelist()
+            failed = sum(1 for name in names if name.endswith("_ERROR.txt"))
+            return elapsed, failed, len(body)
+        return elapsed, 0, len(body)
+
+    for _ in range(settings["warmup"]):
+        post(corpus[:1], False)
+    skip = len(read_traces(trace_log))
+
+    started = time.perf_counter()
+    if mode == "single":
+        with ThreadPoolExecutor(settings["concurrency"]) as pool:
+            outcomes = list(pool.map(lambda item: post([item], False), corpus))
+    else:
+        size = settings["batch_size"] or len(corpus)
+        batches = [corpus[i:i + size] for i in range(0, len(corpus), size)]
+        with ThreadPoolExecutor(settings["concurrency"]) as pool:
+            outcomes = list(pool.map(lambda files: post(files, True), batches))
+    wall = time.perf_counter() - started
+
+    rss, child_rss = peak_rss_mb()
+    traces = read_traces(trace_log, skip)
+    return {
+        "mode": mode,
+        "resumes": len(corpus),
+        "requests": len(outcomes),
+        "failed": sum(failed for _, failed, _ in outcomes),
+        "wall_seconds": round(wall, 3),
+        "throughput_per_second": round(len(corpus) / wall, 3) if wall else None,
+        "request_latency": summarize([elapsed for elapsed, _, _ in outcomes]),
+        "stages": stage_summaries(traces),
+        "output_bytes": sum(size for _, _, size in outcomes),
+        "peak_rss_mb": rss,
+        "peak_child_rss_mb": child_rss,
+        "app_import_seconds": round(import_seconds, 3),
+    }
+
+
+def run_render(backend, settings):
+    """Render the default template with one PDF backend in this (fresh) process and return its results"""
+    os.environ.update({
+        "GEMINI_API_KEY": "benchmark",
+        "DEDUPE_INDEX_PATH": "",
+        "JOBS_FOLDER": os.path.join(tempfile.mkdtemp(prefix="resume-bench-"), "jobs"),
+        "PDF_RENDER_BACKEND": backend,
+    })
+    os.environ.update(settings["env"])
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    import app as appmod
+    rss_before, _ = peak_rss_mb()
+    rng = random.Random(settings["seed"])
+    pages = settings["pages"]
+    documents = [make_resume_data(rng, pages[i % len(pages)]) for i in range(settings["resumes"])]
+
+    def render(data):
+        started = time.perf_counter()
+        try:
+            with appmod.app.app_context():
+                output, error = appmod.render_resume(data)
+        except Exception as e:
+            output, error = None, str(e)
+        return time.perf_counter() - started, error, len(output) if output else 0
+
+    for data in documents[:settings["warmup"]]:
+        render(dict(data))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(settings["concurrency"]) as pool:
+        outcomes = list(pool.map(render, documents))
+    wall = time.perf_counter() - started
+
+    errors = [error for _, error, _ in outcomes if error]
+    if errors:
+        print(f"render-{backend}: {len(errors)} failed, e.g. {errors[0]}")
+    rss, child_rss = peak_rss_mb()
+    return {
+        "mode": f"render-{backend}",
+        "resumes": len(documents),
+        "requests": len(outcomes),
+        "failed": len(errors),
+        "wall_seconds": round(wall, 3),
+        "throughput_per_second": round(len(documents) / wall, 3) if wall else None,
+        "request_latency": {"count": 0},
+        "stages": {"render": summarize([elapsed for elapsed, error, _ in outcomes if not error])},
+        "output_bytes": sum(size for _, _, size in outcomes),
+        "peak_rss_mb": rss,
+        "peak_child_rss_mb": child_rss,
+        "rss_after_import_mb": rss_before,
+    }
+
+
+# Runs in a new interpreter per sample. The first request after the import is
+# where engines that load lazily are paid for.
+STARTUP_SCRIPT = """
+import io, sys, json, time
+started = time.perf_counter()
+import app as appmod
+imported = time.perf_counter()
+with open(sys.argv[1], 'rb') as f:
+    pdf = f.read()
+response = appmod.app.test_client().post(
+    '/', data={'resume': [(io.BytesIO(pdf), 'resume.pdf')]}, content_type='multipart/form-data')
+response.get_data()
+finished = time.perf_counter()
+print(json.dumps({"import": imported - started, "first_request": finished - imported,
+                  "status": response.status_code, "mimetype": response.mimetype, "modules": len(sys.modules)}))
+"""
+
+
+def run_startup(settings):
+    """Time cold starts: each sample imports the app in a new interpreter and serves one resume"""
+    work_dir = tempfile.mkdtemp(prefix="resume-bench-")
+    pdf_path = os.path.join(work_dir, "resume.pdf")
+    with open(pdf_path, 'wb') as f:
+        f.write(make_corpus(1, settings["pages"], settings["seed"])[0][1])
+    env = dict(os.environ, **{
+        "GEMINI_API_BASE": settings["api_base"],
+        "GEMINI_API_KEY": "benchmark",
+        "HEURISTIC_EXTRACTION_ENABLED": "1" if settings["heuristic"] else "0",
+        "EXTRACTION_CACHE_ENABLED": "0",
+        "DEDUPE_INDEX_PATH": "",
+        "JOBS_FOLDER": os.path.join(work_dir, "jobs"),
+    })
+    env.update(settings["env"])
+
+    samples = []
+    failed = 0
+    started = time.perf_counter()
+    for _ in range(settings["startup_runs"]):
+        sample_started = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, pdf_path], env=env, capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        elapsed = time.perf_counter() - sample_started
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            print(proc.stderr[-2000:])
+            failed += 1
+            continue
+        sample = json.loads(lines[-1])
+        failed += sample["status"] != 200 or sample["mimetype"] not in OUTPUT_MIMETYPES
+        sample["process"] = elapsed
+        samples.append(sample)
+    wall = time.perf_counter() - started
+
+    _, child_rss = peak_rss_mb()
+    return {
+        "mode": "startup",
+        "resumes": len(samples),
+        "requests": len(samples),
+        "failed": failed,
+        "wall_seconds": round(wall, 3),
+        "throughput_per_second": None,
+        "request_latency": {"count": 0},
+        "stages": {stage: summarize([sample[stage] for sample in samples])
+                   for stage in ("import", "first_request", "process")},
+        "output_bytes": 0,
+        "peak_rss_mb": None,
+        "peak_child_rss_mb": child_rss,
+        "modules_loaded": percentile([sample["modules"] for sample in samples], 50),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_results(report):
+    for mode, result in report["results"].items():
+        if mode == "startup":
+            print(f"\n== startup: {result['resumes']} cold starts, {result['failed']} failed, "
+                  f"{result['modules_loaded']} modules loaded, peak RSS {result['peak_child_rss_mb']} MB")
+        else:
+            print(f"\n== {mode}: {result['resumes']} resumes in {result['wall_seconds']}s "
+                  f"({result['throughput_per_second']}/s), {result['failed']} failed, "
+                  f"peak RSS {result['peak_rss_mb']} MB (children {result['peak_child_rss_mb']} MB)")
+            if result.get("rss_after_import_mb") is not None:
+                print(f"RSS after importing the app {result['rss_after_import_mb']} MB")
+        print(f"{'stage':<16}{'count':>7}{'p50':>10}{'p90':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        rows = dict(result["stages"], request=result["request_latency"])
+        for stage, stats in rows.items():
+            if not stats.get("count"):
+                continue
+            print(f"{stage:<16}{stats['count']:>7}" + "".join(
+                f"{stats[key] * 1000:>9.1f}m" for key in ("p50", "p90", "p95", "p99", "max")))
+
+
+def print_comparison(baseline, report):
+    print("\n== change vs baseline (latency: negative is better, throughput: positive is better)")
+    for mode, result in report["results"].items():
+        old = baseline.get("results", {}).get(mode)
+        if not old:
+            continue
+        if old.get("throughput_per_second") and result.get("throughput_per_second"):
+            change = (result["throughput_per_second"] / old["throughput_per_second"] - 1) * 100
+            print(f"{mode}: throughput {change:+.1f}%")
+        for stage, stats in result["stages"].items():
+            before = old["stages"].get(stage, {})
+            if before.get("p50") and stats.get("p50"):
+                p50 = (stats["p50"] / before["p50"] - 1) * 100
+                p95 = (stats["p95"] / before["p95"] - 1) * 100 if before.get("p95") else 0.0
+                print(f"  {stage:<16} p50 {p50:+7.1f}%   p95 {p95:+7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the resume pipeline with a fake Gemini server")
+    parser.add_argument('--modes', default="single,batch",
+                        help="Comma-separated modes: single, batch, startup, render")
+    parser.add_argument('--resumes', type=int, default=24, help="Resumes per mode")
+    parser.add_argument('--pages', default="1,2,4", help="Comma-separated page counts to cycle through")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--concurrency', type=int, default=4, help="Concurrent HTTP requests")
+    parser.add_argument('--batch-size', type=int, default=0, help="Resumes per batch upload (0 = all in one)")
+    parser.add_argument('--warmup', type=int, default=1, help="Unmeasured single requests before each mode")
+    parser.add_argument('--llm-latency', type=float, default=0.5, help="Fake Gemini seconds per request")
+    parser.add_argument('--llm-jitter', type=float, default=0.1)
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    parser.add_argument('--startup-runs', type=int, default=5, help="Cold starts timed in startup mode")
+    parser.add_argument('--render-backends', default="wkhtmltopdf,pymupdf",
+                        help="PDF backends compared in render mode")
+    parser.add_argument('--heuristic', action='store_true', help="Let the local extractor skip the fake API")
+    parser.add_argument('--env', action='append', default=[], metavar="KEY=VALUE",
+                        help="Extra app settings, e.g. --env GEMINI_BATCH_SIZE=1 (repeatable)")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--compare', help="Print the change against a previous --output file")
+    args = parser.parse_args(argv)
+    modes = args.modes.split(',')
+    if any(mode not in ("single", "batch", "startup", "render") for mode in modes):
+        parser.error("--modes must be a comma-separated list of single, batch, startup and render")
+
+    fake = FakeGeminiServer(latency=args.llm_latency, jitter=args.llm_jitter,
+                            error_rate=args.llm_error_rate, seed=args.seed).start()
+    settings = {
+        "api_base": fake.base_url,
+        "resumes": args.resumes,
+        "pages": [int(p) for p in args.pages.split(',')],
+        "seed": args.seed,
+        "concurrency": args.concurrency,
+        "batch_size": args.batch_size,
+        "warmup": args.warmup,
+        "startup_runs": args.startup_runs,
+        "heuristic": args.heuristic,
+        "env": dict(item.split('=', 1) for item in args.env),
+    }
+
+    report = {
+        "benchmark": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "llm_latency": args.llm_latency,
+            "llm_jitter": args.llm_jitter,
+            "llm_error_rate": args.llm_error_rate,
+            **{key: value for key, value in settings.items() if key != "api_base"},
+        },
+        "results": {},
+    }
+
+    try:
+        for mode in modes:
+            if mode == "startup":
+                report["results"][mode] = run_startup(settings)
+                continue
+            if mode == "render":
+                for backend in args.render_backends.split(','):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                        report["results"][f"render-{backend}"] = pool.submit(run_render, backend, settings).result()
+                continue
+            # A fresh process per mode keeps peak RSS and warm caches separate
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                report["results"][mode] = pool.submit(run_mode, mode, settings).result()
+    finally:
+        report["benchmark"]["llm_requests"] = fake.requests
+        fake.stop()
+
+    print_results(report)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(json.load(f), report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
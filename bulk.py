@@ -0,0 +1,365 @@
+"""Format a directory (or manifest) of resumes offline, without going through HTTP
+
+Resumes are split into chunks that a pool of worker processes runs through
+the same extract -> AI -> render pipeline as batch uploads (run_batch), so
+duplicates, the extraction cache and Gemini request batching all apply.
+Outputs are written as each chunk finishes, to a directory or a ZIP archive,
+and every finished resume is recorded in a checkpoint file: rerunning the
+same command after an interruption skips what is already done.
+
+    python bulk.py resumes/ --output formatted/
+    python bulk.py manifest.txt --output formatted.zip --template templates/my.docx --processes 4
+"""
+import os
+import sys
+import json
+import time
+import zipfile
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from uploads import Upload
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def find_inputs(source):
+    """Return (path, name) for each PDF under a directory, or listed in a manifest file
+
+    A manifest has one PDF path per line (relative paths are relative to the
+    manifest); blank lines and lines starting with # are skipped. ``name`` is
+    the path relative to the directory or manifest and names the output;
+    names that would give two inputs the same output get a numeric suffix.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            paths += [os.path.join(root, name) for name in sorted(files) if name.lower().endswith('.pdf')]
+        base = source
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source, encoding='utf-8') as f:
+            lines = [line.strip() for line in f]
+        paths = [os.path.join(base, line) for line in lines if line and not line.startswith('#')]
+
+    inputs = []
+    taken = set()
+    for path in paths:
+        name = os.path.relpath(path, base)
+        if name.startswith('..'):
+            name = os.path.basename(path)
+        stem, extension = os.path.splitext(name.replace(os.sep, '/'))
+        # Outputs are named after the stem with spaces replaced (see app.batch_entry), and
+        # may land on a case-insensitive file system
+        unique, number = stem, 1
+        while unique.replace(' ', '_').lower() in taken:
+            number += 1
+            unique = f"{stem}_{number}"
+        taken.add(unique.replace(' ', '_').lower())
+        inputs.append((os.path.abspath(path), unique + extension))
+    return inputs
+
+
+def read_checkpoint(path):
+    """Return {input path: record} for resumes finished in earlier runs"""
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by an interruption
+                continue
+            records[record["input"]] = record
+    return records
+
+
+class DirectoryOutput:
+    """Writes each output file into a directory as soon as it arrives"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, name, data):
+        target = os.path.join(self.path, *name.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with open(target + ".tmp", 'wb') as f:
+            f.write(data)
+        os.replace(target + ".tmp", target)
+
+    def remove(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.path, *name.split('/')))
+            except FileNotFoundError:
+                pass
+
+    def commit(self):
+        pass
+
+
+class ZipOutput:
+    """Appends outputs to a ZIP archive, which is valid again after every commit
+
+    Appending overwrites the archive's central directory, so a copy of it is
+    saved first; if a run is interrupted mid-commit, the next run restores it
+    and the archive is back to its last committed state. Entries can't be
+    removed by appending, so ``remove`` writes a new archive without them
+    next to the old one and swaps it in; call it once, before any writes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.backup = path + ".dir"
+        self.rewrite_path = path + ".tmp"
+        self._pending = []
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._restore()
+
+    def _restore(self):
+        if os.path.exists(self.rewrite_path):
+            # An interrupted rewrite; the old archive is still in place
+            os.remove(self.rewrite_path)
+        if not os.path.exists(self.backup):
+            return
+        try:
+            with zipfile.ZipFile(self.path):
+                pass
+        except (OSError, zipfile.BadZipFile):
+            with open(self.backup, 'rb') as f:
+                offset = int.from_bytes(f.read(8), 'little')
+                central_directory = f.read()
+            with open(self.path, 'ab') as f:
+                f.truncate(offset)
+                f.write(central_directory)
+            print(f"Restored {self.path} to its last checkpoint")
+        os.remove(self.backup)
+
+    def write(self, name, data):
+        self._pending.append((name, data))
+
+    def remove(self, names):
+        names = set(names)
+        if not names or not os.path.exists(self.path) or not os.path.getsize(self.path):
+            return
+        with zipfile.ZipFile(self.path) as source:
+            if not names & set(source.namelist()):
+                return
+            with zipfile.ZipFile(self.rewrite_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                for info in source.infolist():
+                    if info.filename not in names:
+                        zip_file.writestr(info, source.read(info))
+        with open(self.rewrite_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(self.rewrite_path, self.path)
+
+    def commit(self):
+        if not self._pending:
+            return
+        offset, central_directory = 0, b""
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            with zipfile.ZipFile(self.path) as zip_file:
+                offset = zip_file.start_dir
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                central_directory = f.read()
+        with open(self.backup, 'wb') as f:
+            f.write(offset.to_bytes(8, 'little') + central_directory)
+            f.flush()
+            os.fsync(f.fileno())
+
+        with zipfile.ZipFile(self.path, 'a', zipfile.ZIP_DEFLATED) as zip_file:
+            for name, data in self._pending:
+                zip_file.writestr(name, data)
+        self._pending = []
+        os.remove(self.backup)
+
+
+# Set in each worker process by _init_worker
+_app = None
+_template = None
+
+
+def _init_worker(template_path):
+    global _app, _template
+    # The pool already runs one process per core
+    os.environ.setdefault("PDF_EXTRACT_PROCESSES", "1")
+    # The app resolves templates and uploads relative to its own directory
+    os.chdir(APP_DIR)
+    _app, _template, error = load_template(template_path)
+    if error:
+        raise RuntimeError(error)
+
+
+def load_template(template_path):
+    """Import the app and compile the custom template, if any
+
+    Returns (app module, (template, template_type), error). Call it from the
+    app's directory.
+    """
+    import app as appmod
+    from werkzeug.datastructures import FileStorage
+    if not template_path:
+        return appmod, (None, "html"), None
+    with open(template_path, 'rb') as f:
+        template_file = FileStorage(stream=f, filename=os.path.basename(template_path))
+        custom_template, template_type, _, error = appmod.load_custom_template(template_file)
+    return appmod, (custom_template, template_type), error
+
+
+def _process_chunk(chunk):
+    """Run one chunk of (path, name) through the batch pipeline; returns (path, entry name, data, error) for each"""
+    uploads = []
+    results = [None] * len(chunk)
+    for i, (path, name) in enumerate(chunk):
+        try:
+            uploads.append(Upload.from_path(path, name))
+        except OSError as e:
+            results[i] = (path, f"{name}_ERROR.txt", f"Failed to process: {e}", str(e))
+    readable = [i for i, result in enumerate(results) if result is None]
+
+    for position, output, error in _app.run_batch(uploads, *_template):
+        i = readable[position]
+        path, name = chunk[i]
+        entry_name, data = _app.batch_entry(name, output, error)
+        results[i] = (path, entry_name, data, error)
+    return results
+
+
+def run(inputs, output, checkpoint_path, processes, chunk_size=8, template_path=None, retry_failed=False):
+    """Process inputs with a pool of worker processes and return the run's totals"""
+    done = read_checkpoint(checkpoint_path)
+    todo = [
+        (path, name) for path, name in inputs
+        if path not in done or (retry_failed and done[path]["status"] == "failed")
+    ]
+    # Retried resumes get a new entry, so their earlier ones (e.g. an _ERROR.txt) go first, in one pass
+    output.remove({done[path]["output"] for path, _ in todo if done.get(path, {}).get("output")})
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    totals = {
+        "inputs": len(inputs),
+        "skipped": len(inputs) - len(todo),
+        "processed": 0,
+        "succeeded": 0,
+        "failed": 0,
+        "output_bytes": 0,
+        "interrupted": False,
+    }
+    print(f"{len(todo)} resumes to process ({totals['skipped']} already done) in {len(chunks)} chunks "
+          f"on {processes} processes")
+
+    started = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(template_path,))
+    pending = set()
+    next_chunk = 0
+    try:
+        with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+            while next_chunk < len(chunks) or pending:
+                # Keep a couple of chunks queued per process, not the whole run
+                while next_chunk < len(chunks) and len(pending) < processes * 2:
+                    pending.add(pool.submit(_process_chunk, chunks[next_chunk]))
+                    next_chunk += 1
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results = future.result()
+                    for path, entry_name, data, error in results:
+                        output.write(entry_name, data)
+                        totals["output_bytes"] += len(data)
+                        totals["failed" if error else "succeeded"] += 1
+                    # Outputs are committed before they are recorded as done
+                    output.commit()
+                    for path, entry_name, data, error in results:
+                        record = {"input": path, "status": "failed" if error else "done", "output": entry_name}
+                        if error:
+                            record["error"] = error
+                        checkpoint.write(json.dumps(record) + "\n")
+                    checkpoint.flush()
+                    os.fsync(checkpoint.fileno())
+                    totals["processed"] += len(results)
+                    elapsed = time.perf_counter() - started
+                    print(f"{totals['processed']}/{len(todo)} done, {totals['failed']} failed, "
+                          f"{totals['processed'] / elapsed:.2f} resumes/s")
+    except KeyboardInterrupt:
+        totals["interrupted"] = True
+        for future in pending:
+            future.cancel()
+    finally:
+        pool.shutdown(wait=not totals["interrupted"], cancel_futures=True)
+
+    totals["wall_seconds"] = round(time.perf_counter() - started, 3)
+    return totals
+
+
+def print_summary(totals):
+    wall = totals["wall_seconds"]
+    print()
+    print(f"{'inputs':<20}{totals['inputs']:>12}")
+    print(f"{'already done':<20}{totals['skipped']:>12}")
+    print(f"{'processed':<20}{totals['processed']:>12}")
+    print(f"{'succeeded':<20}{totals['succeeded']:>12}")
+    print(f"{'failed':<20}{totals['failed']:>12}")
+    print(f"{'wall seconds':<20}{wall:>12.1f}")
+    if wall and totals["processed"]:
+        print(f"{'resumes/s':<20}{totals['processed'] / wall:>12.2f}")
+        print(f"{'seconds/resume':<20}{wall / totals['processed']:>12.3f}")
+    print(f"{'output MB':<20}{totals['output_bytes'] / 1024 / 1024:>12.1f}")
+    if totals["interrupted"]:
+        print("\nInterrupted; run the same command again to continue where it stopped")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Format a directory or manifest of resume PDFs offline")
+    parser.add_argument('source', help="Directory of PDFs (searched recursively) or a manifest file with one path per line")
+    parser.add_argument('--output', required=True, help="Output directory, or a path ending in .zip")
+    parser.add_argument('--template', help="Custom HTML or DOCX template")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument('--chunk-size', type=int, default=8,
+                        help="Resumes per pipeline run in a worker (they share Gemini requests)")
+    parser.add_argument('--checkpoint', help="Progress file (default: <output>.checkpoint.jsonl)")
+    parser.add_argument('--retry-failed', action='store_true', help="Process resumes that failed in an earlier run again")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.source):
+        parser.error(f"{args.source} does not exist")
+    inputs = find_inputs(args.source)
+    if not inputs:
+        parser.error(f"No PDF files found in {args.source}")
+
+    template_path = os.path.abspath(args.template) if args.template else None
+    if template_path:
+        # Checked here, so a bad template is reported before any worker starts
+        if not os.path.isfile(template_path):
+            parser.error(f"{args.template} does not exist")
+        cwd = os.getcwd()
+        os.chdir(APP_DIR)
+        try:
+            _, _, error = load_template(template_path)
+        finally:
+            os.chdir(cwd)
+        if error:
+            parser.error(f"Invalid template {args.template}: {error}")
+
+    output_path = args.output.rstrip('/\\')
+    checkpoint_path = args.checkpoint or output_path + ".checkpoint.jsonl"
+    if output_path.lower().endswith('.zip'):
+        output = ZipOutput(output_path)
+    else:
+        output = DirectoryOutput(output_path)
+
+    totals = run(inputs, output, checkpoint_path, max(1, args.processes), max(1, args.chunk_size),
+                 template_path, args.retry_failed)
+    print_summary(totals)
+    return 1 if totals["interrupted"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import closing
+
+
+WORD_RE = re.compile(r'\w+')
+
+
+def text_hash(text):
+    """SHA-256 of text's words, lowercased, so copies that differ only in case, spacing or punctuation match"""
+    return hashlib.sha256(" ".join(WORD_RE.findall(text.lower())).encode('utf-8')).hexdigest()
+
+
+class _Group:
+    """Resumes in a batch with the same text; each stage runs once for all of them"""
+
+    def __init__(self):
+        self.members = 1
+        self._lock = threading.Lock()
+        self._results = {}
+        self._running = {}
+
+    def run(self, stage, func):
+        """Return func()'s (result, error), calling it only if no other member has"""
+        with self._lock:
+            if stage in self._results:
+                return self._results[stage]
+            done = self._running.get(stage)
+            owner = done is None
+            if owner:
+                done = self._running[stage] = threading.Event()
+        if not owner:
+            done.wait()
+            return self._results[stage]
+
+        try:
+            result = func()
+        except Exception as e:
+            result = None, f"Error processing resume: {str(e)}"
+        with self._lock:
+            # Only groups with other members need the result; later members of a
+            # single-resume group (rare) just run the stage again
+            if self.members > 1:
+                self._results[stage] = result
+            del self._running[stage]
+        done.set()
+        return result
+
+
+class BatchDeduper:
+    """Groups a batch's resumes that have the same text (by text_hash)
+
+    ``assign(key)`` returns the resume's group and whether it joined an
+    existing one. The batch stages run extraction and rendering through
+    ``group.run`` so a group is processed once and shares the output; whichever
+    member gets to a stage first does the work, so no worker waits on a
+    resume that hasn't started. Resumes that are merely similar are processed
+    separately: they are often different people on the same template, or
+    different versions of a CV.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups = {}
+
+    def assign(self, key):
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = _Group()
+                return group, False
+        with group._lock:
+            group.members += 1
+        return group, True
+
+
+class DuplicateIndex:
+    """Persistent index of processed resumes for spotting repeated files across batches
+
+    Resumes are looked up by the SHA-256 of the uploaded file, so an exact
+    copy skips text extraction as well as the AI call. Resumes with the same
+    text in another file are left to the extraction cache. Near-duplicates
+    aren't looked up: a resume with another person's contact details or an
+    added job can be 0.97 similar, and its data would be wrong. Entries are
+    stored in SQLite, shared between gunicorn workers, expire after a TTL and
+    are capped at ``max_entries`` (oldest removed first). ``version`` should
+    change whenever the extraction would (model, prompt, text preparation and
+    local extraction settings); entries from other versions are ignored.
+    """
+
+    def __init__(self, path, version="", ttl=30 * 24 * 3600, max_entries=50000):
+        self.path = path
+        self.version = version
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = None
+        self._connection_pid = None
+        # Schema setup uses its own connection so none is left open to be inherited by a fork
+        with closing(sqlite3.connect(path, timeout=30)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " version TEXT NOT NULL,"
+                " sha256 TEXT,"
+                " data TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            # Left over from indexes that also matched similar texts
+            conn.execute("DROP TABLE IF EXISTS bands")
+            conn.execute("CREATE INDEX IF NOT EXISTS documents_sha256 ON documents (sha256)")
+            conn.execute("CREATE INDEX IF NOT EXISTS documents_created ON documents (created_at)")
+            conn.commit()
+
+    @property
+    def _conn(self):
+        # A connection must not be used across a fork (gunicorn preload_app), so each process opens its own
+        if self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _cutoff(self):
+        return time.time() - self.ttl if self.ttl else 0
+
+    def find(self, sha256):
+        """Return the structured data stored for a file with this SHA-256, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM documents WHERE sha256 = ? AND version = ? AND created_at >= ?"
+                " ORDER BY id DESC LIMIT 1",
+                (sha256, self.version, self._cutoff())
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def add(self, sha256, structured_data):
+        """Index a processed resume by its file hash"""
+        if not sha256:
+            return
+        data = json.dumps(structured_data)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO documents (version, sha256, data, created_at) VALUES (?, ?, ?, ?)",
+                (self.version, sha256, data, time.time())
+            )
+            self._prune()
+            self._conn.commit()
+
+    def _prune(self):
+        stale = "created_at < ?"
+        params = (self._cutoff(),)
+        if self.max_entries:
+            # Everything older than the max_entries-th newest entry goes too
+            row = self._conn.execute(
+                "SELECT id FROM documents ORDER BY id DESC LIMIT 1 OFFSET ?", (self.max_entries,)
+            ).fetchone()
+            if row is not None:
+                stale += " OR id <= ?"
+                params += (row[0],)
+        self._conn.execute(f"DELETE FROM documents WHERE {stale}", params)
+
+    def stats(self):
+        """Return hit/miss counters and the number of indexed resumes"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+        }
@@ -0,0 +1,55 @@
+import threading
+from io import BytesIO
+from jinja2 import Environment
+
+
+class _CachingEnvironment(Environment):
+    """Jinja2 environment that compiles each distinct template source only once
+
+    docxtpl turns every XML part of the document into a Jinja2 source string
+    and compiles it on every render. Those strings only depend on the
+    template, so the compiled templates can be shared between renders.
+    """
+
+    def __init__(self, max_entries=64, **options):
+        super().__init__(**options)
+        self.max_entries = max_entries
+        self._compiled = {}
+        self._compiled_lock = threading.Lock()
+
+    def from_string(self, source, globals=None, template_class=None):
+        if globals is not None or template_class is not None:
+            return super().from_string(source, globals, template_class)
+        with self._compiled_lock:
+            template = self._compiled.get(source)
+        if template is None:
+            template = super().from_string(source)
+            with self._compiled_lock:
+                if len(self._compiled) >= self.max_entries:
+                    self._compiled.clear()
+                self._compiled[source] = template
+        return template
+
+
+class DocxRenderer:
+    """Render a DOCX template to a new document for every context, entirely in memory
+
+    Each render works on its own copy of the document parsed from the
+    template bytes, so one renderer can be shared between requests and
+    threads. The compiled Jinja2 templates for the document parts are reused
+    across renders.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.jinja_env = _CachingEnvironment()
+
+    def render(self, context):
+        """Render the template with context and return the DOCX bytes"""
+        # docxtpl (with python-docx and lxml) is only imported once a DOCX template is used
+        from docxtpl import DocxTemplate
+        doc = DocxTemplate(BytesIO(self.source))
+        doc.render(context, self.jinja_env)
+        output = BytesIO()
+        doc.save(output)
+        return output.getvalue()
@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import closing
+
+
+class ExtractionCache:
+    """Persistent cache of AI-extracted resume data, keyed by a hash of its inputs
+
+    Entries live in a SQLite file so they survive restarts and are shared
+    between gunicorn workers. The cache is bounded by total size (least
+    recently used entries are evicted first) and entries expire after a TTL.
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, ttl=30 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = None
+        self._connection_pid = None
+        # Schema setup uses its own connection so none is left open to be inherited by a fork
+        with closing(sqlite3.connect(path, timeout=30)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS extractions ("
+                " key TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS extractions_accessed ON extractions (accessed_at)")
+            conn.commit()
+
+    @property
+    def _conn(self):
+        # A connection must not be used across a fork (gunicorn preload_app), so each process opens its own
+        if self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    @staticmethod
+    def make_key(text, *versions):
+        """Hash the resume text together with anything that changes the extraction (model, prompt)"""
+        digest = hashlib.sha256()
+        for part in versions:
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached structured data for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, created_at FROM extractions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            data, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE extractions SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(data)
+
+    def put(self, key, structured_data):
+        """Store structured data under key and evict entries over the size budget"""
+        data = json.dumps(structured_data)
+        size = len(data.encode('utf-8'))
+        if self.max_bytes and size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, data, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, data, size, now, now)
+            )
+            if self.ttl:
+                self._conn.execute("DELETE FROM extractions WHERE created_at < ?", (now - self.ttl,))
+            if self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM extractions ORDER BY accessed_at ASC"
+        ).fetchall():
+            self._conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
@@ -0,0 +1,133 @@
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+BATCH_TAG = re.compile(r'<resume index="(\d+)">\n(.*?)\n</resume>', re.DOTALL)
+SINGLE_TEXT = re.compile(r'"""(.*)"""', re.DOTALL)
+EMAIL = re.compile(r'[\w.+-]+@[\w-]+\.[\w.]+')
+
+
+def fake_resume_data(resume_text):
+    """Build a plausible extraction result from the resume text"""
+    lines = [line.strip() for line in resume_text.splitlines() if line.strip()]
+    email = EMAIL.search(resume_text)
+    return {
+        "name": lines[0] if lines else "",
+        "email": email.group(0) if email else "",
+        "phone": "",
+        "linkedin": "",
+        "github": "",
+        "education": [{"degree": "B.Tech", "major": "Computer Science", "collegeName": "Example University",
+                       "cgpa": "8.5", "startDate": "2016", "endDate": "2020"}],
+        "workExperience": [{"title": "Software Engineer", "company": "Example Corp", "location": "Remote",
+                            "startDate": "2020", "endDate": "Present",
+                            "description": "Built data pipelines in Python and led a team of four."}],
+        "projects": [{"name": "Resume Parser", "description": "Parses resumes with an LLM.",
+                      "technologies": "Python, Flask", "link": ""}],
+        "skills": ["Python", "Flask", "SQL"],
+        "achievements": [],
+        "otherInfo": ""
+    }
+
+
+class FakeGeminiServer:
+    """Local stand-in for the Gemini generateContent API
+
+    Answers every request after ``latency`` seconds (plus up to ``jitter``
+    more), with a fake extraction for each resume in the prompt. A
+    ``error_rate`` fraction of requests get a 503 instead. Point
+    GEMINI_API_BASE at ``base_url`` to use it.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.5, jitter=0.1, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1beta"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-gemini', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, payload):
+        """Return (status, body) for a generateContent payload"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            failed = self._random.random() < self.error_rate
+        time.sleep(delay)
+        if failed:
+            return 503, {"error": {"code": 503, "message": "The model is overloaded."}}
+
+        prompt = payload["contents"][0]["parts"][0]["text"]
+        resumes = BATCH_TAG.findall(prompt)
+        if resumes:
+            result = [dict(fake_resume_data(text), index=int(index)) for index, text in resumes]
+        else:
+            match = SINGLE_TEXT.search(prompt)
+            result = fake_resume_data(match.group(1) if match else prompt)
+        return 200, {"candidates": [{"content": {"role": "model", "parts": [{"text": json.dumps(result)}]}}]}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    payload = json.loads(self.rfile.read(length))
+                    status, body = server.respond(payload)
+                except (ValueError, KeyError, IndexError):
+                    status, body = 400, {"error": {"code": 400, "message": "Invalid request"}}
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a fake Gemini API server")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help="Seconds per request")
+    parser.add_argument('--jitter', type=float, default=0.1, help="Extra random seconds per request")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    fake = FakeGeminiServer(port=args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    print(f"Fake Gemini API on {fake.base_url} (set GEMINI_API_BASE to this)")
+    try:
+        fake.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,71 @@
+from pipeline import Coalescer
+from prompt_text import estimate_tokens
+
+
+def format_batch_resumes(resume_texts):
+    """Wrap each resume in a tag carrying its index so results can be mapped back"""
+    return "\n".join(
+        f'<resume index="{i}">\n{text}\n</resume>' for i, text in enumerate(resume_texts)
+    )
+
+
+def map_batch_results(items, count):
+    """Return a list of count entries with the object for each index (None where it's missing)"""
+    results = [None] * count
+    if not isinstance(items, list):
+        return results
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        index = item.pop("index", None)
+        try:
+            index = int(index)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < count and results[index] is None:
+            results[index] = item
+    return results
+
+
+class GeminiBatcher:
+    """Pack concurrent resume extractions into multi-resume Gemini requests
+
+    ``extract`` calls that arrive close together are grouped (up to
+    ``max_batch`` resumes and ``max_tokens`` estimated input tokens) and sent
+    with ``request_batch(texts)``, which returns ``(list_of_data_or_None,
+    error)``. Resumes missing from the response, or the whole batch if the
+    request failed, are retried one by one with ``request_one(text)``.
+    """
+
+    def __init__(self, request_batch, request_one, max_batch=4, max_tokens=24000, max_wait=0.1, workers=4):
+        self.request_batch = request_batch
+        self.request_one = request_one
+        self._coalescer = Coalescer(
+            self._extract_many,
+            max_batch=max_batch,
+            max_wait=max_wait,
+            workers=workers,
+            weight=estimate_tokens,
+            max_weight=max_tokens
+        )
+
+    def extract(self, resume_text):
+        """Return (structured_data, error) for one resume"""
+        return self._coalescer.submit(resume_text)
+
+    def _extract_many(self, resume_texts):
+        if len(resume_texts) == 1:
+            return [self.request_one(resume_texts[0])]
+
+        results, error = self.request_batch(resume_texts)
+        if error:
+            print(f"Batched extraction of {len(resume_texts)} resumes failed, retrying one by one: {error}")
+            results = [None] * len(resume_texts)
+
+        missing = sum(1 for data in results if data is None)
+        if missing and not error:
+            print(f"Batched extraction missed {missing} of {len(resume_texts)} resumes, retrying them one by one")
+        return [
+            (data, None) if data is not None else self.request_one(text)
+            for text, data in zip(resume_texts, results)
+        ]
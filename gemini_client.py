@@ -0,0 +1,238 @@
+import os
+import time
+import random
+import sqlite3
+import threading
+from contextlib import closing
+
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class TokenBucket:
+    """Token bucket limiter shared by every thread in this process that calls ``acquire``
+
+    Holds up to ``capacity`` tokens and refills at ``rate`` tokens per second.
+    Other processes have their own; see SharedTokenBucket.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until one is available; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class SharedTokenBucket:
+    """Token bucket kept in a SQLite file, shared by every process and thread that uses the file
+
+    Same interface as TokenBucket. gunicorn workers and bulk worker processes
+    each have their own client, so a per-process bucket lets N processes send
+    N times the rate; this one keeps them under it together. The refill is
+    computed from wall-clock time, the only clock the processes share.
+    """
+
+    def __init__(self, path, rate, capacity, name="default"):
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity
+        self.name = name
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = None
+        self._connection_pid = None
+        # Schema setup uses its own connection so none is left open to be inherited by a fork
+        with closing(sqlite3.connect(path, timeout=30)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " name TEXT PRIMARY KEY,"
+                " tokens REAL NOT NULL,"
+                " updated REAL NOT NULL)"
+            )
+            conn.commit()
+
+    @property
+    def _conn(self):
+        # A connection must not be used across a fork (gunicorn preload_app), so each process opens its own
+        if self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30,
+                                               isolation_level=None)
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _take(self):
+        """Take a token if there is one; returns 0 on success, else the seconds until one is due"""
+        with self._lock:
+            conn = self._conn
+            # IMMEDIATE takes the write lock up front, so the read and update are atomic across processes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)).fetchone()
+                tokens, updated = row if row is not None else (self.capacity, now)
+                tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+                delay = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    delay = (1 - tokens) / self.rate
+                conn.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                             (self.name, tokens, now))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return delay
+
+    def acquire(self):
+        """Take one token, sleeping until one is available; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            delay = self._take()
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+
+class GeminiClient:
+    """HTTP client for the Gemini API with a pooled session, timeouts, retries and rate limiting
+
+    Requests go through one keep-alive ``requests.Session`` per process.
+    Responses with a status in ``RETRY_STATUSES`` and connection errors or
+    timeouts are retried up to ``max_retries`` times with full-jitter
+    exponential backoff (or the server's Retry-After, when given). If
+    ``requests_per_minute`` is set, every attempt first takes a token from a
+    bucket: one in ``limiter_path`` shared by every process using that file,
+    or, without a path, one shared by the threads of this process only.
+    ``base_url`` can point at a local stub server for testing.
+    """
+
+    def __init__(self, base_url, api_key, connect_timeout=10, read_timeout=60, max_retries=4,
+                 backoff=0.5, max_backoff=20, requests_per_minute=0, burst=1, pool_size=16, limiter_path=None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.limiter = None
+        if requests_per_minute > 0 and limiter_path:
+            self.limiter = SharedTokenBucket(limiter_path, requests_per_minute / 60.0, max(1, burst), name="gemini")
+        elif requests_per_minute > 0:
+            self.limiter = TokenBucket(requests_per_minute / 60.0, max(1, burst))
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "requests": 0,
+            "attempts": 0,
+            "retries": 0,
+            "failures": 0,
+            "rate_limited": 0,
+            "limiter_wait_seconds": 0.0,
+            "limiter_wait_max_seconds": 0.0,
+        }
+
+    def _get_session(self):
+        with self._session_lock:
+            # Sockets shouldn't be shared with a forked parent, so each process opens its own pool
+            if self._session is None or self._session_pid != os.getpid():
+                # requests is imported with the first session rather than at startup
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+                self._session_pid = os.getpid()
+            return self._session
+
+    def _count(self, **increments):
+        with self._metrics_lock:
+            for name, value in increments.items():
+                self._metrics[name] += value
+
+    def _wait_for_token(self):
+        if self.limiter is None:
+            return
+        waited = self.limiter.acquire()
+        with self._metrics_lock:
+            self._metrics["limiter_wait_seconds"] += waited
+            self._metrics["limiter_wait_max_seconds"] = max(self._metrics["limiter_wait_max_seconds"], waited)
+
+    def _retry_delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return min(self.max_backoff, max(0.0, float(retry_after)))
+                except ValueError:
+                    pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def metrics(self):
+        """Return a snapshot of the request, retry and limiter counters"""
+        with self._metrics_lock:
+            return dict(self._metrics)
+
+    def generate_content(self, model, payload):
+        """POST a generateContent request and return (response_json, error)"""
+        url = f"{self.base_url}/models/{model}:generateContent"
+        headers = {"x-goog-api-key": self.api_key or ""}
+        import requests
+        session = self._get_session()
+        self._count(requests=1)
+
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_token()
+            self._count(attempts=1)
+            last = attempt == self.max_retries
+            try:
+                res = session.post(url, json=payload, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last:
+                    self._count(failures=1)
+                    return None, f"API Error: {str(e)}"
+                self._count(retries=1)
+                time.sleep(self._retry_delay(attempt))
+                continue
+
+            if res.status_code == 200:
+                try:
+                    return res.json(), None
+                except ValueError:
+                    self._count(failures=1)
+                    return None, f"API Error: invalid JSON response - {res.text[:200]}"
+
+            if res.status_code == 429:
+                self._count(rate_limited=1)
+            if res.status_code not in RETRY_STATUSES or last:
+                self._count(failures=1)
+                return None, f"API Error: {res.status_code} - {res.text}"
+
+            print(f"Gemini API returned {res.status_code}, retrying (attempt {attempt + 1} of {self.max_retries})")
+            self._count(retries=1)
+            time.sleep(self._retry_delay(attempt, res))
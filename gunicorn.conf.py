@@ -0,0 +1,13 @@
+"""gunicorn settings, picked up automatically by `gunicorn app:app` from this directory
+
+The master imports the app and its engines (PyMuPDF, pdfkit, docxtpl,
+requests) once before forking, so each worker starts with them already
+loaded and shares their memory until it writes to it. Worker threads,
+process pools, HTTP sessions and SQLite connections are all created per
+process on first use, so nothing opened in the master leaks into workers.
+"""
+import os
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+if preload_app:
+    os.environ.setdefault("PRELOAD_ENGINES", "1")
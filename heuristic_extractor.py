@@ -0,0 +1,472 @@
+import re
+from pdf_extractor import LayoutLine
+
+SECTION_ALIASES = {
+    "workExperience": [
+        "experience", "work experience", "professional experience", "employment",
+        "employment history", "work history", "internships", "internship experience",
+        "relevant experience", "career history"
+    ],
+    "education": [
+        "education", "academic background", "academics", "educational background",
+        "academic qualifications", "qualifications", "education and training"
+    ],
+    "projects": [
+        "projects", "personal projects", "academic projects", "key projects",
+        "selected projects", "side projects", "project experience"
+    ],
+    "skills": [
+        "skills", "technical skills", "core competencies", "key skills", "technologies",
+        "tech stack", "tools and technologies", "skills and tools", "areas of expertise"
+    ],
+    "achievements": [
+        "achievements", "awards", "honors", "honours", "accomplishments",
+        "certifications", "awards and achievements", "certifications and awards",
+        "honors and awards", "extracurricular activities", "activities"
+    ],
+    "summary": [
+        "summary", "profile", "professional summary", "about me", "objective",
+        "career objective", "profile summary"
+    ],
+}
+
+# Headers of sections the schema has no field for; their lines go to otherInfo
+OTHER_SECTION_HEADERS = [
+    "publications", "languages", "interests", "hobbies", "hobbies and interests", "references",
+    "volunteering", "volunteer experience", "patents", "presentations", "conferences",
+    "memberships", "professional memberships", "affiliations", "courses", "coursework",
+    "relevant coursework", "training", "personal details", "personal information",
+    "declaration", "additional information", "research"
+]
+
+_ALIAS_TO_SECTION = {alias: section for section, aliases in SECTION_ALIASES.items() for alias in aliases}
+_ALIAS_TO_SECTION.update((alias, "other") for alias in OTHER_SECTION_HEADERS)
+
+EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+PHONE_RE = re.compile(r'(?<!\w)(\+?\d[\d\s().-]{7,}\d)(?!\w)')
+LINKEDIN_RE = re.compile(r'(?:https?://)?(?:[a-z]{2,3}\.)?linkedin\.com/[^\s,|)]+', re.IGNORECASE)
+GITHUB_RE = re.compile(r'(?:https?://)?(?:www\.)?github\.com/[^\s,|)]+', re.IGNORECASE)
+URL_RE = re.compile(r'(?:https?://|www\.)[^\s,|)]+|\b[\w-]+\.(?:com|io|dev|app|org|net)/[^\s,|)]*', re.IGNORECASE)
+HEADER_CLEAN_RE = re.compile(r'[^a-z& ]+')
+BULLET_RE = re.compile(r'^\s*(?:[•●▪◦‣∙·*\-–—]|\d+[.)])\s*')
+
+_MONTH = r'(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|jun(?:e)?|jul(?:y)?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?'
+_DATE = rf'(?:{_MONTH}\s*,?\s*\d{{4}}|\d{{1,2}}/\d{{4}}|\d{{4}})'
+DATE_RANGE_RE = re.compile(
+    rf'({_DATE})\s*(?:-|–|—|to|till|until)\s*({_DATE}|present|current|now|ongoing|date)',
+    re.IGNORECASE
+)
+SINGLE_DATE_RE = re.compile(rf'\b({_MONTH}\s*,?\s*\d{{4}}|(?:19|20)\d{{2}})\b', re.IGNORECASE)
+
+DEGREE_RE = re.compile(
+    r"\b(ph\.?\s?d\.?|doctor(?:ate)?(?: of [a-z]+)?|master(?:'?s)?(?: of [a-z]+)?|bachelor(?:'?s)?(?: of [a-z]+)?|"
+    r"m\.?\s?tech|b\.?\s?tech|m\.?\s?sc|b\.?\s?sc|m\.?\s?s\.?|b\.?\s?s\.?|m\.?\s?a\.?|b\.?\s?a\.?|"
+    r"m\.?\s?e\.?|b\.?\s?e\.?|mba|bba|bca|mca|b\.?\s?com|m\.?\s?com|diploma|associate(?:'?s)?(?: degree)?|"
+    r"high school|higher secondary|secondary school|hsc|ssc)(?=[\s,.(]|$)",
+    re.IGNORECASE
+)
+MAJOR_RE = re.compile(r'\b(?:in|of)\s+([A-Z][\w&/ .-]+?)(?=\s*(?:[,|(–—-]|\bfrom\b|\bat\b|$))')
+INSTITUTION_RE = re.compile(r'\b(university|college|institute|school|academy|polytechnic|iit|nit|iiit)\b', re.IGNORECASE)
+CGPA_RE = re.compile(
+    r'\b(?:c?gpa|cpi|sgpa|grade)\s*[:\-]?\s*(\d+(?:\.\d+)?(?:\s*/\s*\d+(?:\.\d+)?)?)|(\d{2}(?:\.\d+)?\s*%)',
+    re.IGNORECASE
+)
+TITLE_WORDS_RE = re.compile(
+    r'\b(engineer|developer|intern|manager|analyst|consultant|scientist|designer|architect|lead|'
+    r'director|specialist|administrator|associate|assistant|officer|coordinator|researcher|'
+    r'programmer|technician|executive|head|founder|co-founder|trainee|fellow|teaching assistant|'
+    r'research assistant|sde|swe|devops|tester|qa)\b',
+    re.IGNORECASE
+)
+TECH_LABEL_RE = re.compile(r'^(?:tech(?:nologies|nology| stack)?|tools|built with|stack|skills used)\s*[:\-]\s*(.+)$', re.IGNORECASE)
+SKILL_LABEL_RE = re.compile(r'^[A-Za-z /&+-]{2,40}:\s*')
+SKILL_SPLIT_RE = re.compile(r'\s*(?:,|\||•|●|▪|;|/(?=\s)|·)\s*')
+COMPANY_SPLIT_RE = re.compile(r'\s+(?:at|@)\s+|\s*[|,–—]\s*|\s+-\s+')
+
+
+def _normalize_header(text):
+    return re.sub(r'\s+', ' ', HEADER_CLEAN_RE.sub(' ', text.lower().replace('&', ' and '))).strip()
+
+
+def header_section(text):
+    """Return the canonical section a header line starts, or None if it isn't a known header"""
+    text = text.strip().rstrip(':').strip()
+    if not text or len(text) > 40 or len(text.split()) > 5:
+        return None
+    return _ALIAS_TO_SECTION.get(_normalize_header(text))
+
+
+def _section_for(line):
+    return header_section(line.text)
+
+
+def _is_unknown_header(line, body_size):
+    """Bold or large, short, mostly upper-case lines that aren't a known section"""
+    text = line.text.strip()
+    if not text or len(text) > 40 or len(text.split()) > 5 or EMAIL_RE.search(text) or any(c.isdigit() for c in text):
+        return False
+    letters = [c for c in text if c.isalpha()]
+    if not letters:
+        return False
+    upper = sum(1 for c in letters if c.isupper()) / len(letters)
+    emphasized = line.bold or (body_size and line.size and line.size > body_size * 1.15)
+    return upper > 0.8 and bool(emphasized)
+
+
+def _to_lines(text, layout):
+    if layout:
+        return [line for line in layout if line.text.strip()]
+    return [LayoutLine(line, 0, False) for line in text.splitlines() if line.strip()]
+
+
+def _body_size(lines):
+    sizes = {}
+    for line in lines:
+        if line.size:
+            sizes[round(line.size, 1)] = sizes.get(round(line.size, 1), 0) + len(line.text)
+    return max(sizes, key=sizes.get) if sizes else 0
+
+
+def segment_sections(lines):
+    """Split lines into {"header": [...], section: [...]} by section header lines"""
+    body_size = _body_size(lines)
+    sections = {"header": []}
+    current = "header"
+    for line in lines:
+        section = _section_for(line)
+        if section is None and _is_unknown_header(line, body_size) and current != "header":
+            section = "other"
+        if section is not None:
+            current = section
+            sections.setdefault(current, [])
+            continue
+        sections.setdefault(current, []).append(line)
+    return sections
+
+
+def _strip_bullet(text):
+    return BULLET_RE.sub('', text).strip()
+
+
+def _is_bullet(text):
+    return bool(BULLET_RE.match(text)) and not DATE_RANGE_RE.match(text.strip())
+
+
+def _find_name(header_lines, all_lines):
+    candidates = header_lines[:6] or all_lines[:3]
+    if any(line.size for line in candidates):
+        # The largest text at the top of the page is almost always the name
+        candidates = sorted(candidates, key=lambda line: -line.size)
+    for line in candidates:
+        text = line.text.strip()
+        if EMAIL_RE.search(text) or URL_RE.search(text) or PHONE_RE.search(text) or _section_for(line):
+            continue
+        words = text.split()
+        if 1 < len(words) <= 4 and all(re.match(r"^[A-Za-z][A-Za-z.'-]*$", w) for w in words):
+            return text.title() if text.isupper() else text
+    return ""
+
+
+def _split_entries(lines, is_start):
+    """Group lines into entries, starting a new entry whenever is_start(line, current_entry, next_line) is true"""
+    entries = []
+    texts = [line.text.strip() for line in lines]
+    for i, text in enumerate(texts):
+        following = texts[i + 1] if i + 1 < len(texts) else ""
+        if not entries or is_start(text, entries[-1], following):
+            entries.append([text])
+        else:
+            entries[-1].append(text)
+    return entries
+
+
+def _date_range(lines):
+    for text in lines:
+        match = DATE_RANGE_RE.search(text)
+        if match:
+            return match.group(1).strip(), match.group(2).strip().title()
+    for text in lines:
+        match = SINGLE_DATE_RE.search(text)
+        if match:
+            return "", match.group(1).strip()
+    return "", ""
+
+
+def _without_dates(text):
+    text = DATE_RANGE_RE.sub('', text)
+    return re.sub(r'\s*[|,–—-]\s*$', '', text).strip(' |,–—-')
+
+
+def _parse_education(lines):
+    def is_start(text, entry, following):
+        has_previous = any(DEGREE_RE.search(t) for t in entry)
+        has_institution = any(INSTITUTION_RE.search(t) for t in entry)
+        return (DEGREE_RE.search(text) and has_previous) or (INSTITUTION_RE.search(text) and has_institution)
+
+    education = []
+    for entry in _split_entries(lines, is_start):
+        degree = major = college = cgpa = ""
+        for text in entry:
+            if not degree:
+                match = DEGREE_RE.search(text)
+                if match:
+                    degree = match.group(1).strip()
+                    major_match = MAJOR_RE.search(text[match.end():]) or MAJOR_RE.search(text)
+                    if major_match:
+                        major = major_match.group(1).strip()
+            if not college and INSTITUTION_RE.search(text):
+                college = _without_dates(text)
+                if DEGREE_RE.search(college):
+                    # "B.Tech, ABC University" - keep the institution part only
+                    parts = [p for p in re.split(r'\s*[,|–—]\s*', college) if INSTITUTION_RE.search(p)]
+                    college = parts[0] if parts else college
+            if not cgpa:
+                match = CGPA_RE.search(text)
+                if match:
+                    cgpa = (match.group(1) or match.group(2)).replace(' ', '')
+        start, end = _date_range(entry)
+        if degree or college:
+            education.append({
+                "degree": degree,
+                "major": major,
+                "collegeName": college,
+                "cgpa": cgpa,
+                "startDate": start,
+                "endDate": end
+            })
+    return education
+
+
+def _title_and_company(header):
+    title = company = location = ""
+    parts = [p.strip() for p in COMPANY_SPLIT_RE.split(header) if p and p.strip()]
+    for part in parts:
+        if not title and TITLE_WORDS_RE.search(part):
+            title = part
+        elif not company:
+            company = part
+        elif not location:
+            location = part
+    return title, company, location
+
+
+def _job_header(entry):
+    """The leading non-bullet lines of a job (title, company, dates), at most 3"""
+    header = []
+    for text in entry:
+        if _is_bullet(text) or (header and text.endswith('.')):
+            break
+        header.append(text)
+        if DATE_RANGE_RE.search(text) or len(header) == 3:
+            break
+    return header
+
+
+def _parse_experience(lines):
+    def is_start(text, entry, following):
+        # A new job starts at a non-bullet line once the current one has bullets or a date:
+        # a line with dates, or a title line with the dates on the next line
+        if _is_bullet(text):
+            return False
+        entry_has_date = any(DATE_RANGE_RE.search(t) for t in entry)
+        entry_has_bullets = any(_is_bullet(t) for t in entry)
+        if entry_has_bullets:
+            return True
+        if not entry_has_date:
+            return False
+        if DATE_RANGE_RE.search(text):
+            return True
+        return (TITLE_WORDS_RE.search(text) is not None and not text.endswith('.')
+                and DATE_RANGE_RE.match(following) is not None)
+
+    jobs = []
+    for entry in _split_entries(lines, is_start):
+        header_lines = _job_header(entry)
+        description = [_strip_bullet(t) for t in entry[len(header_lines):]]
+        start, end = _date_range(header_lines)
+        title = company = location = ""
+        for text in header_lines:
+            t, c, l = _title_and_company(_without_dates(text))
+            title = title or t
+            if c and c != title:
+                company = company or c
+            location = location or l
+        if title or company:
+            jobs.append({
+                "title": title,
+                "company": company,
+                "location": location,
+                "startDate": start,
+                "endDate": end,
+                "description": "\n".join(description)
+            })
+    return jobs
+
+
+def _parse_projects(lines):
+    def is_start(text, entry, following):
+        if _is_bullet(text) or TECH_LABEL_RE.match(text) or URL_RE.fullmatch(text):
+            return False
+        return any(_is_bullet(t) for t in entry)
+
+    projects = []
+    for entry in _split_entries(lines, is_start):
+        name = technologies = link = ""
+        description = []
+        for i, text in enumerate(entry):
+            url = URL_RE.search(text)
+            if url and not link:
+                link = url.group(0)
+            tech = TECH_LABEL_RE.match(_strip_bullet(text))
+            if tech:
+                technologies = tech.group(1).strip()
+            elif i == 0 and not _is_bullet(text):
+                name_part, _, rest = _without_dates(URL_RE.sub('', text)).partition('|')
+                name = name_part.strip(' -–—:')
+                if rest and not technologies:
+                    technologies = rest.strip()
+            elif not URL_RE.fullmatch(text):
+                description.append(_strip_bullet(text))
+        if name:
+            projects.append({
+                "name": name,
+                "description": " ".join(description),
+                "technologies": technologies,
+                "link": link
+            })
+    return projects
+
+
+def _parse_skills(lines):
+    skills = []
+    seen = set()
+    for line in lines:
+        text = SKILL_LABEL_RE.sub('', _strip_bullet(line.text))
+        for skill in SKILL_SPLIT_RE.split(text):
+            skill = skill.strip(' .')
+            if skill and len(skill) <= 40 and skill.lower() not in seen:
+                seen.add(skill.lower())
+                skills.append(skill)
+    return skills
+
+
+def _parse_bullets(lines):
+    items = []
+    for line in lines:
+        text = line.text.strip()
+        if items and not _is_bullet(text) and text[:1].islower():
+            # Wrapped continuation of the previous item
+            items[-1] += " " + text
+        else:
+            items.append(_strip_bullet(text))
+    return [item for item in items if item]
+
+
+def extract_resume_fields(text, layout=None):
+    """Extract resume fields without the AI API
+
+    Returns (structured_data, confidence) where structured_data follows the
+    same schema as the AI prompt and confidence is between 0 and 1.
+    """
+    lines = _to_lines(text, layout)
+    sections = segment_sections(lines)
+    header_lines = sections.get("header", [])
+
+    def first(regex):
+        match = regex.search(text)
+        return match.group(0).strip() if match else ""
+
+    phone = ""
+    for match in PHONE_RE.finditer(text):
+        digits = re.sub(r'\D', '', match.group(1))
+        if 10 <= len(digits) <= 15 and not DATE_RANGE_RE.search(match.group(1)):
+            phone = match.group(1).strip()
+            break
+
+    data = {
+        "name": _find_name(header_lines, lines),
+        "email": first(EMAIL_RE),
+        "phone": phone,
+        "linkedin": first(LINKEDIN_RE),
+        "github": first(GITHUB_RE),
+        "education": _parse_education(sections.get("education", [])),
+        "workExperience": _parse_experience(sections.get("workExperience", [])),
+        "projects": _parse_projects(sections.get("projects", [])),
+        "skills": _parse_skills(sections.get("skills", [])),
+        "achievements": _parse_bullets(sections.get("achievements", [])),
+        "otherInfo": " ".join(line.text.strip() for line in sections.get("other", [])),
+        "profileSummary": " ".join(line.text.strip() for line in sections.get("summary", []))
+    }
+    return data, score_extraction(data, sections, lines)
+
+
+WORD_RE = re.compile(r'\w+')
+
+
+def _field_text(value):
+    if isinstance(value, dict):
+        return " ".join(_field_text(v) for v in value.values())
+    if isinstance(value, list):
+        return " ".join(_field_text(v) for v in value)
+    return str(value)
+
+
+def _looks_like_header(text):
+    """A short line that reads like a section header: known to us, ending in ':' or all upper-case"""
+    text = text.strip()
+    if header_section(text) or text.endswith(':'):
+        return True
+    letters = [c for c in text if c.isalpha()]
+    return len(letters) > 3 and len(text.split()) <= 4 and all(c.isupper() for c in letters)
+
+
+def score_extraction(data, sections, lines):
+    """Estimate how completely the heuristic extraction captured the resume (0 to 1)"""
+    score = 0.0
+    score += 0.15 if data["name"] else 0.0
+    score += 0.10 if data["email"] else 0.0
+    score += 0.05 if data["phone"] else 0.0
+    score += 0.10 if data["skills"] else 0.0
+
+    # Education and experience entries should be complete, not just present
+    if data["education"]:
+        complete = sum(1 for e in data["education"] if e["degree"] and e["collegeName"])
+        score += 0.20 * complete / len(data["education"])
+    if data["workExperience"]:
+        complete = sum(1 for j in data["workExperience"] if j["title"] and j["company"] and (j["startDate"] or j["endDate"]))
+        score += 0.25 * complete / len(data["workExperience"])
+    elif data["education"] and "workExperience" not in sections:
+        # Students often have no experience section at all; lean on education instead
+        score += 0.10
+
+    # Lines left outside any known section mean we probably missed something
+    known = sum(len(v) for k, v in sections.items() if k not in ("header", "other"))
+    coverage = known / max(1, len(lines) - min(len(sections.get("header", [])), 6))
+    score += 0.15 * min(1.0, coverage)
+
+    # Sections that were found but produced nothing are a strong sign of a bad parse
+    for section, key in (("workExperience", "workExperience"), ("education", "education"), ("projects", "projects")):
+        if sections.get(section) and not data[key]:
+            score -= 0.2
+
+    # Section lines whose words mostly didn't make it into any field were lost or misread
+    parsed_words = set(WORD_RE.findall(_field_text(data).lower()))
+    body = [line for name, section in sections.items() if name != "header" for line in section]
+    unparsed = 0
+    for line in body:
+        words = WORD_RE.findall(line.text.lower())
+        if words and sum(w in parsed_words for w in words) < len(words) / 2:
+            unparsed += 1
+    if body:
+        score -= 0.4 * unparsed / len(body)
+
+    # Jobs without a description usually mean their lines went into the header
+    if data["workExperience"]:
+        empty = sum(1 for j in data["workExperience"] if not j["description"].strip())
+        score -= 0.2 * empty / len(data["workExperience"])
+
+    # Headers of sections we don't know swallow what follows into the skills
+    suspicious = sum(1 for skill in data["skills"] if _looks_like_header(skill) or re.search(r'\b(?:19|20)\d{2}\b', skill))
+    score -= 0.1 * suspicious
+
+    return max(0.0, min(1.0, round(score, 3)))
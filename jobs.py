@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from contextlib import closing
+from werkzeug.utils import secure_filename
+
+
+class JobQueue:
+    """SQLite-backed queue of resume jobs processed by a local pool of worker threads
+
+    ``handler(job, report)`` does the actual work for a claimed job. It calls
+    ``report(position, status, error=None, output_name=None)`` as each file
+    finishes and returns ``(artifact_path, download_name, error)``. Any
+    process sharing the same folder can submit jobs or poll them; whichever
+    worker claims a job first processes it. While a job runs, its worker
+    writes a heartbeat every ``heartbeat_interval`` seconds; a running job
+    whose heartbeat is older than ``stale_after`` seconds (its worker died)
+    is claimed again.
+    """
+
+    def __init__(self, folder, handler, workers=2, poll_interval=0.5, stale_after=5 * 60, heartbeat_interval=30,
+                 retention=24 * 3600):
+        self.folder = folder
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.heartbeat_interval = heartbeat_interval
+        self.retention = retention
+        self.db_path = os.path.join(folder, 'jobs.sqlite3')
+        self._threads = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+        os.makedirs(folder, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " status TEXT NOT NULL,"
+                " options TEXT NOT NULL,"
+                " template_path TEXT,"
+                " artifact_path TEXT,"
+                " download_name TEXT,"
+                " error TEXT,"
+                " worker TEXT,"
+                " heartbeat_at REAL,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            # Queues created before heartbeats were added
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if 'heartbeat_at' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_files ("
+                " job_id TEXT NOT NULL,"
+                " position INTEGER NOT NULL,"
+                " filename TEXT NOT NULL,"
+                " path TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " error TEXT,"
+                " output_name TEXT,"
+                " PRIMARY KEY (job_id, position))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def job_dir(self, job_id):
+        return os.path.join(self.folder, job_id)
+
+    def submit(self, files, template=None, options=None):
+        """Save the uploaded files to disk, queue a job for them and return its id"""
+        job_id = uuid.uuid4().hex
+        job_dir = self.job_dir(job_id)
+        os.makedirs(job_dir)
+
+        rows = []
+        for position, file in enumerate(files):
+            path = os.path.join(job_dir, f"{position}_{secure_filename(file.filename) or 'resume.pdf'}")
+            file.save(path)
+            rows.append((job_id, position, file.filename, path, 'queued'))
+
+        template_path = None
+        if template is not None:
+            template_path = os.path.join(job_dir, f"template_{secure_filename(template.filename)}")
+            template.save(template_path)
+
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO jobs (id, status, options, template_path, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(options or {}), template_path, now, now)
+            )
+            conn.executemany(
+                "INSERT INTO job_files (job_id, position, filename, path, status) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute("COMMIT")
+        return job_id
+
+    def get(self, job_id):
+        """Return the job and its files as a dict, or None if it doesn't exist"""
+        with closing(self._connect()) as conn:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            files = conn.execute(
+                "SELECT * FROM job_files WHERE job_id = ? ORDER BY position", (job_id,)
+            ).fetchall()
+        job = dict(job)
+        job["options"] = json.loads(job["options"])
+        job["files"] = [dict(f) for f in files]
+        return job
+
+    def start(self):
+        """Start the worker threads for this process (safe to call on every request)"""
+        with self._start_lock:
+            # Threads don't survive a fork, so a new process gets its own pool
+            if self._pid == os.getpid() and all(t.is_alive() for t in self._threads):
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            for n in range(max(1, self.workers)):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _claim(self, worker):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Jobs left 'running' by a worker that died stop getting heartbeats and are picked up again
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued'"
+                " OR (status = 'running' AND COALESCE(heartbeat_at, updated_at) < ?)"
+                " ORDER BY created_at LIMIT 1",
+                (now - self.stale_after,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+                (worker, now, now, row["id"])
+            )
+            conn.execute("COMMIT")
+        return self.get(row["id"])
+
+    def _heartbeat(self, job_id, worker, stop):
+        """Mark the job as alive every heartbeat_interval seconds until stop is set"""
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                with closing(self._connect()) as conn:
+                    claimed = conn.execute(
+                        "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                        (time.time(), job_id, worker)
+                    ).rowcount
+                if not claimed:
+                    print(f"Job {job_id}: claimed by another worker")
+                    return
+            except sqlite3.Error as e:
+                print(f"Job {job_id}: heartbeat failed: {str(e)}")
+
+    def _report(self, job_id, position, status, error=None, output_name=None):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE job_files SET status = ?, error = ?, output_name = ? WHERE job_id = ? AND position = ?",
+                (status, error, output_name, job_id, position)
+            )
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (now, job_id))
+
+    def _finish(self, job_id, worker, artifact_path, download_name, error):
+        """Record the job's outcome; returns False if another worker has claimed it meanwhile"""
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, artifact_path = ?, download_name = ?, error = ?, updated_at = ?"
+                " WHERE id = ? AND worker = ?",
+                ('failed' if error else 'done', artifact_path, download_name, error, time.time(), job_id, worker)
+            ).rowcount > 0
+
+    def _purge_expired(self):
+        if not self.retention:
+            return
+        cutoff = time.time() - self.retention
+        with closing(self._connect()) as conn:
+            expired = [row["id"] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (cutoff,)
+            ).fetchall()]
+            for job_id in expired:
+                conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        for job_id in expired:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def _work(self):
+        worker = f"{os.getpid()}-{threading.current_thread().name}"
+        last_purge = 0
+        while True:
+            try:
+                if time.time() - last_purge > 60:
+                    self._purge_expired()
+                    last_purge = time.time()
+
+                job = self._claim(worker)
+                if job is None:
+                    time.sleep(self.poll_interval)
+                    continue
+
+                print(f"Job {job['id']}: processing {len(job['files'])} files")
+                job_id = job["id"]
+
+                def report(position, status, error=None, output_name=None):
+                    self._report(job_id, position, status, error, output_name)
+
+                stop = threading.Event()
+                heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, worker, stop),
+                                             name=f'job-heartbeat-{job_id[:8]}', daemon=True)
+                heartbeat.start()
+                try:
+                    artifact_path, download_name, error = self.handler(job, report)
+                except Exception as e:
+                    artifact_path, download_name, error = None, None, f"Unexpected error: {str(e)}"
+                finally:
+                    stop.set()
+                    heartbeat.join()
+                if self._finish(job_id, worker, artifact_path, download_name, error):
+                    print(f"Job {job_id}: {'failed' if error else 'done'}")
+                else:
+                    print(f"Job {job_id}: finished after another worker claimed it; result discarded")
+            except Exception as e:
+                print(f"Job worker error: {str(e)}")
+                time.sleep(self.poll_interval)
@@ -0,0 +1,342 @@
+import re
+import json
+
+
+class JSONRepairError(ValueError):
+    """Raised when no JSON value can be recovered from the text"""
+
+    def __init__(self, msg, pos):
+        super().__init__(f"{msg} at position {pos}")
+        self.msg = msg
+        self.pos = pos
+
+
+WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?')
+WORD_RE = re.compile(r'[A-Za-z_$][\w$]*')
+HEX4_RE = re.compile(r'[0-9a-fA-F]{4}')
+
+# Characters that end a string, by the quote that opened it. Smart quotes are
+# accepted as delimiters because models sometimes emit them around keys and values.
+STRING_CLOSERS = {'"': '"', "'": "'", '“': '”"', '”': '”"'}
+STRING_CHUNK_RES = {
+    quote: re.compile('[^\\\\\x00-\x1f' + re.escape(closers) + ']*')
+    for quote, closers in STRING_CLOSERS.items()
+}
+SIMPLE_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+LITERALS = {"true": True, "false": False, "null": None}
+PYTHON_LITERALS = {"True": True, "False": False, "None": None, "NaN": None, "undefined": None}
+
+
+class _Parser:
+    """Recursive-descent JSON parser that repairs what it can in one pass over the text"""
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        self.end = len(text)
+        self.repairs = []
+
+    def repaired(self, name):
+        if name not in self.repairs:
+            self.repairs.append(name)
+
+    def skip_whitespace(self):
+        self.pos = WHITESPACE_RE.match(self.text, self.pos).end()
+
+    def at_end(self):
+        if self.pos >= self.end:
+            self.repaired("closed truncated output")
+            return True
+        return False
+
+    def parse_value(self):
+        self.skip_whitespace()
+        if self.at_end():
+            return None
+        char = self.text[self.pos]
+        if char == '{':
+            return self.parse_object()
+        if char == '[':
+            return self.parse_array()
+        if char in STRING_CLOSERS:
+            return self.parse_string()
+        if char == '-' or char.isdigit():
+            return self.parse_number()
+        if char.isalpha():
+            return self.parse_literal()
+        raise JSONRepairError(f"Unexpected character {char!r}", self.pos)
+
+    def parse_object(self):
+        self.pos += 1
+        result = {}
+        while True:
+            self.skip_whitespace()
+            if self.at_end():
+                return result
+            char = self.text[self.pos]
+            if char == '}':
+                self.pos += 1
+                return result
+            if char == ']':
+                self.repaired("fixed mismatched bracket")
+                self.pos += 1
+                return result
+            if char == ',':
+                self.repaired("removed extra comma")
+                self.pos += 1
+                continue
+
+            if char in STRING_CLOSERS:
+                key = self.parse_string()
+            else:
+                match = WORD_RE.match(self.text, self.pos)
+                if not match:
+                    raise JSONRepairError(f"Expected a key, found {char!r}", self.pos)
+                self.repaired("quoted bare keys")
+                key = match.group()
+                self.pos = match.end()
+
+            self.skip_whitespace()
+            if self.at_end():
+                return result
+            if self.text[self.pos] == ':':
+                self.pos += 1
+            else:
+                self.repaired("inserted missing colon")
+            self.skip_whitespace()
+            if self.at_end():
+                return result
+            result[key] = self.parse_value()
+
+            if not self.after_item('}'):
+                return result
+
+    def parse_array(self):
+        self.pos += 1
+        result = []
+        while True:
+            self.skip_whitespace()
+            if self.at_end():
+                return result
+            char = self.text[self.pos]
+            if char == ']':
+                self.pos += 1
+                return result
+            if char == '}':
+                self.repaired("fixed mismatched bracket")
+                self.pos += 1
+                return result
+            if char == ',':
+                self.repaired("removed extra comma")
+                self.pos += 1
+                continue
+            result.append(self.parse_value())
+
+            if not self.after_item(']'):
+                return result
+
+    def after_item(self, closer):
+        """Consume the separator after an item; False if the container ended or the text ran out"""
+        self.skip_whitespace()
+        if self.at_end():
+            return False
+        char = self.text[self.pos]
+        if char == ',':
+            self.pos += 1
+            self.skip_whitespace()
+            if self.pos < self.end and self.text[self.pos] in '}]':
+                self.repaired("removed trailing comma")
+            return True
+        if char in '}]':
+            if char != closer:
+                self.repaired("fixed mismatched bracket")
+            self.pos += 1
+            return False
+        self.repaired("inserted missing comma")
+        return True
+
+    def parse_string(self):
+        text = self.text
+        quote = text[self.pos]
+        if quote == "'":
+            self.repaired("replaced single quotes")
+        elif quote != '"':
+            self.repaired("replaced smart quotes")
+        closers = STRING_CLOSERS[quote]
+        chunk_re = STRING_CHUNK_RES[quote]
+        self.pos += 1
+        parts = []
+        while True:
+            match = chunk_re.match(text, self.pos)
+            parts.append(match.group())
+            self.pos = match.end()
+            if self.pos >= self.end:
+                self.repaired("closed truncated output")
+                return "".join(parts)
+            char = text[self.pos]
+            if char in closers:
+                self.pos += 1
+                if self.closes_string():
+                    return "".join(parts)
+                # A quote inside the value that the model forgot to escape
+                self.repaired("escaped inner quotes")
+                parts.append(char)
+            elif char == '\\':
+                parts.append(self.parse_escape())
+            else:
+                # Raw control characters; keep line breaks and tabs, drop the rest
+                self.repaired("cleaned control characters")
+                if char in '\n\t':
+                    parts.append(char)
+                self.pos += 1
+
+    def closes_string(self):
+        pos = WHITESPACE_RE.match(self.text, self.pos).end()
+        # Another string straight after is a missing comma rather than an inner quote
+        return pos >= self.end or self.text[pos] in ',:}]"'
+
+    def parse_escape(self):
+        text = self.text
+        if self.pos + 1 >= self.end:
+            self.pos = self.end
+            return ""
+        char = text[self.pos + 1]
+        self.pos += 2
+        if char in SIMPLE_ESCAPES:
+            return SIMPLE_ESCAPES[char]
+        if char == 'u':
+            match = HEX4_RE.match(text, self.pos)
+            if match:
+                self.pos = match.end()
+                code = int(match.group(), 16)
+                # Join UTF-16 surrogate pairs
+                if 0xD800 <= code < 0xDC00 and text.startswith('\\u', self.pos):
+                    low = HEX4_RE.match(text, self.pos + 2)
+                    if low and 0xDC00 <= int(low.group(), 16) < 0xE000:
+                        self.pos = low.end()
+                        return chr(0x10000 + ((code - 0xD800) << 10) + (int(low.group(), 16) - 0xDC00))
+                return chr(code)
+        self.repaired("removed invalid escapes")
+        return char
+
+    def parse_number(self):
+        match = NUMBER_RE.match(self.text, self.pos)
+        if not match:
+            if self.pos + 1 >= self.end:
+                self.pos = self.end
+                self.repaired("closed truncated output")
+                return None
+            raise JSONRepairError("Invalid number", self.pos)
+        self.pos = match.end()
+        number = match.group()
+        if '.' in number or 'e' in number or 'E' in number:
+            return float(number)
+        return int(number)
+
+    def parse_literal(self):
+        match = WORD_RE.match(self.text, self.pos)
+        word = match.group()
+        self.pos = match.end()
+        if word in LITERALS:
+            return LITERALS[word]
+        if word in PYTHON_LITERALS:
+            self.repaired("replaced non-JSON literals")
+            return PYTHON_LITERALS[word]
+        if self.pos >= self.end and any(literal.startswith(word) for literal in LITERALS):
+            self.repaired("closed truncated output")
+            return None
+        raise JSONRepairError(f"Unexpected word {word!r}", self.pos - len(word))
+
+
+def _value_bounds(text):
+    """Index of the first { or [ and of the last } or ]"""
+    starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+    start = min(starts) if starts else -1
+    return start, max(text.rfind('}'), text.rfind(']'))
+
+
+def repair_json(text):
+    """Parse model output as JSON, repairing it where needed
+
+    Returns ``(value, repairs)`` where repairs lists what had to be fixed.
+    Well-formed JSON (optionally wrapped in a code fence) is parsed by the
+    json module directly; anything else goes through a tolerant single-pass
+    parser that handles smart and single quotes, unescaped inner quotes,
+    invalid escapes, control characters, missing or trailing commas and
+    output cut off mid-value. Raises JSONRepairError if no value is found.
+    """
+    start, end = _value_bounds(text)
+    if start == -1:
+        raise JSONRepairError("No JSON object or array found", 0)
+
+    surrounding = "stripped code fences" if '```' in text else "stripped surrounding text"
+
+    if end > start:
+        try:
+            # strict=False accepts raw control characters inside strings
+            value = json.loads(text[start:end + 1], strict=False)
+            return value, [surrounding] if start > 0 or text[end + 1:].strip() else []
+        except ValueError:
+            pass
+
+    parser = _Parser(text)
+    parser.pos = start
+    value = parser.parse_value()
+    if start > 0 or text[parser.pos:].strip():
+        parser.repairs.insert(0, surrounding)
+    return value, parser.repairs
+
+
+def conform_to_schema(value, schema, repairs, path="$"):
+    """Coerce value to a Gemini-style (OpenAPI subset) schema in one walk, noting fixes in repairs"""
+    kind = schema.get("type")
+    if kind == "OBJECT":
+        if isinstance(value, list) and len(value) == 1 and isinstance(value[0], dict):
+            repairs.append(f"{path}: unwrapped single-item array")
+            value = value[0]
+        if not isinstance(value, dict):
+            repairs.append(f"{path}: replaced {type(value).__name__} with object")
+            return {}
+        properties = schema.get("properties", {})
+        for key, item in value.items():
+            if key in properties:
+                value[key] = conform_to_schema(item, properties[key], repairs, f"{path}.{key}")
+        return value
+
+    if kind == "ARRAY":
+        if value is None:
+            return []
+        if not isinstance(value, list):
+            if isinstance(value, str) and schema.get("items", {}).get("type") == "STRING":
+                repairs.append(f"{path}: split string into list")
+                value = [part.strip() for part in value.split(',') if part.strip()]
+            else:
+                repairs.append(f"{path}: wrapped value in list")
+                value = [value]
+        items = schema.get("items")
+        if items:
+            value = [conform_to_schema(item, items, repairs, f"{path}[{i}]") for i, item in enumerate(value)]
+        return value
+
+    if kind == "STRING":
+        if isinstance(value, str):
+            return value
+        if value is None:
+            return ""
+        repairs.append(f"{path}: converted {type(value).__name__} to string")
+        if isinstance(value, list):
+            return ", ".join(str(item) for item in value if item is not None)
+        if isinstance(value, dict):
+            return json.dumps(value)
+        return str(value)
+
+    if kind == "INTEGER":
+        if isinstance(value, bool) or not isinstance(value, int):
+            try:
+                converted = int(str(value).strip())
+            except ValueError:
+                return value
+            repairs.append(f"{path}: converted to integer")
+            return converted
+    return value
@@ -0,0 +1,72 @@
+import re
+import json
+
+
+class KeywordMatcher:
+    """Find which keywords occur anywhere in a text (case-insensitive substrings) in one scan
+
+    All keywords are compiled into a single alternation, longest first, inside
+    a lookahead so a match is tried at every position. The longest keyword
+    found at a position also implies every keyword that is a prefix of it, so
+    the result is the same as checking ``keyword in text`` for each keyword.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = sorted({k.lower() for k in keywords if k}, key=len, reverse=True)
+        self._implied = {k: {other for other in self.keywords if k.startswith(other)} for k in self.keywords}
+        self._pattern = None
+        if self.keywords:
+            self._pattern = re.compile("(?=(" + "|".join(re.escape(k) for k in self.keywords) + "))")
+
+    def find(self, text):
+        """Return the set of keywords found in text"""
+        found = set()
+        if self._pattern is None or not text:
+            return found
+        for match in self._pattern.finditer(text.lower()):
+            keyword = match.group(1)
+            if keyword not in found:
+                found |= self._implied[keyword]
+        return found
+
+
+# Soft skills inferred from resume text: any keyword in a group adds all of its skills
+DEFAULT_SOFT_SKILL_TAXONOMY = [
+    {"keywords": ["lead", "led", "team", "collaborate", "mentored", "managed"],
+     "skills": ["Leadership", "Collaboration"]},
+    {"keywords": ["presented", "communicated", "reported", "wrote", "documented"],
+     "skills": ["Presentation", "Communication"]},
+    {"keywords": ["deadline", "fast-paced", "timely", "delivered", "prioritize", "organized"],
+     "skills": ["Time Management", "Adaptability"]},
+    {"keywords": ["analyze", "solved", "troubleshoot", "problem", "critical thinking"],
+     "skills": ["Problem Solving", "Analytical Thinking"]},
+]
+DEFAULT_SOFT_SKILLS = ["Teamwork", "Communication", "Problem Solving"]
+
+
+def load_soft_skill_taxonomy(path):
+    """Load a taxonomy from a JSON file: {"groups": [{"keywords": [...], "skills": [...]}], "default": [...]}"""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    return config["groups"], config.get("default", DEFAULT_SOFT_SKILLS)
+
+
+class SoftSkillMatcher:
+    """Map keyword hits in resume text to soft skills using a taxonomy built once"""
+
+    def __init__(self, taxonomy=None, default=None):
+        taxonomy = DEFAULT_SOFT_SKILL_TAXONOMY if taxonomy is None else taxonomy
+        self.default = list(DEFAULT_SOFT_SKILLS if default is None else default)
+        self._skills_for = {}
+        for group in taxonomy:
+            for keyword in group["keywords"]:
+                self._skills_for.setdefault(keyword.lower(), set()).update(group["skills"])
+        self._matcher = KeywordMatcher(self._skills_for)
+
+    def infer(self, text):
+        """Return the sorted soft skills for text, or the default ones if nothing matched"""
+        skills = set()
+        for keyword in self._matcher.find(text):
+            skills |= self._skills_for[keyword]
+        skills = {s for s in skills if s} or set(self.default)
+        return sorted(s for s in skills if s)
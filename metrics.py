@@ -0,0 +1,199 @@
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+
+
+# Seconds; covers everything from a regex pass to a slow Gemini call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+
+    def inc(self, value, labels):
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}
+
+    def observe(self, value, labels):
+        key = _label_key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+                break
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _format_value(float(bound)))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(round(total, 6))}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Trace:
+    """Timings and counters recorded for one resume"""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+
+
+class Metrics:
+    """Process-wide counters and histograms, rendered in the Prometheus text format
+
+    ``timer(stage)`` records how long a block took in the ``stage_metric``
+    histogram. Work done while a trace is active on the thread (see
+    ``activate``) is also recorded in that trace, and finished traces are
+    written as one JSON line each to ``trace_log`` ("-" for stdout) if set.
+    """
+
+    def __init__(self, stage_metric="resume_stage_seconds", trace_log=None):
+        self.stage_metric = stage_metric
+        self.trace_log = trace_log
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.histogram(stage_metric, "Time spent in each stage of processing a resume")
+
+    def counter(self, name, help_text):
+        """Register a counter (returns the existing one if already registered)"""
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        """Register a histogram (returns the existing one if already registered)"""
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help_text, buckets))
+
+    def add_collector(self, collect):
+        """Add a callable returning extra exposition lines, called on every render"""
+        self._collectors.append(collect)
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._metrics[name].inc(value, labels)
+        trace = self.current_trace()
+        if trace is not None:
+            trace.counters[name] = trace.counters.get(name, 0) + value
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            self._metrics[name].observe(value, labels)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(self.stage_metric, elapsed, stage=stage)
+            trace = self.current_trace()
+            if trace is not None:
+                trace.spans.append({
+                    "stage": stage,
+                    "start": round(start - trace.started, 6),
+                    "seconds": round(elapsed, 6)
+                })
+
+    def current_trace(self):
+        return getattr(self._local, 'trace', None)
+
+    @contextmanager
+    def activate(self, trace):
+        """Record into trace while the block runs on this thread"""
+        previous = self.current_trace()
+        self._local.trace = trace
+        try:
+            yield trace
+        finally:
+            self._local.trace = previous
+
+    def finish_trace(self, trace, error=None):
+        """Record the trace's end-to-end time as stage "total" and write it to the trace log, if enabled"""
+        elapsed = time.perf_counter() - trace.started
+        self.observe(self.stage_metric, elapsed, stage="total")
+        if not self.trace_log:
+            return
+        record = {
+            "trace_id": trace.id,
+            "name": trace.name,
+            "seconds": round(elapsed, 6),
+            "error": error,
+            "spans": trace.spans,
+            "counters": trace.counters
+        }
+        line = json.dumps(record)
+        with self._lock:
+            if self.trace_log == "-":
+                print(line, flush=True)
+            else:
+                with open(self.trace_log, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [line for metric in self._metrics.values() for line in metric.render()]
+        for collect in self._collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+
+def gauge_lines(name, help_text, value, metric_type="gauge"):
+    """Exposition lines for a single unlabelled value"""
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {_format_value(value)}"]
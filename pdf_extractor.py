@@ -0,0 +1,135 @@
+import os
+import threading
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+
+# One line of text with the layout hints PyMuPDF gives us for it
+LayoutLine = namedtuple('LayoutLine', ['text', 'size', 'bold'])
+
+# A text block with its page, bounding box and dominant font
+TextBlock = namedtuple('TextBlock', ['page', 'x0', 'y0', 'x1', 'y1', 'text', 'font', 'size', 'bold'])
+
+PdfContent = namedtuple('PdfContent', ['text', 'lines', 'blocks', 'page_count', 'truncated'])
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _open(source):
+    # PyMuPDF is imported on first use so starting the app doesn't pay for it
+    import fitz
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=bytes(source), filetype="pdf")
+    return fitz.open(source)
+
+
+def _is_bold(span):
+    return bool(span["flags"] & 16) or "bold" in span["font"].lower()
+
+
+def _extract_page(page, page_number, with_layout):
+    textpage = page.get_textpage()
+    text = page.get_text(textpage=textpage)
+    if not with_layout:
+        return text, (), ()
+
+    lines = []
+    blocks = []
+    for block in page.get_text("dict", textpage=textpage)["blocks"]:
+        block_lines = []
+        font_chars = {}
+        for line in block.get("lines", []):
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            line_text = " ".join(span["text"].strip() for span in spans)
+            lines.append(LayoutLine(line_text, max(span["size"] for span in spans), any(_is_bold(span) for span in spans)))
+            block_lines.append(line_text)
+            for span in spans:
+                key = (span["font"], round(span["size"], 1), _is_bold(span))
+                font_chars[key] = font_chars.get(key, 0) + len(span["text"])
+        if block_lines:
+            font, size, bold = max(font_chars, key=font_chars.get)
+            x0, y0, x1, y1 = (round(v, 1) for v in block["bbox"])
+            blocks.append(TextBlock(page_number, x0, y0, x1, y1, "\n".join(block_lines), font, size, bold))
+    return text, lines, blocks
+
+
+def _extract_page_range(source, start, stop, with_layout):
+    """Extract pages [start, stop) of a document; runs in a worker process"""
+    doc = _open(source)
+    try:
+        return [_extract_page(doc[i], i, with_layout) for i in range(start, stop)]
+    finally:
+        doc.close()
+
+
+def _get_pool(workers):
+    global _pool, _pool_pid
+    with _pool_lock:
+        # A pool inherited through fork isn't usable, so each process creates its own
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn rather than fork: the web process has threads running
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def extract_pdf(source, with_layout=False, max_pages=None, max_chars=None, workers=0, parallel_min_pages=32):
+    """Extract text (and optionally layout lines and blocks) from a PDF path or bytes
+
+    Only the first ``max_pages`` pages are read and the text is cut at
+    ``max_chars``. Pages are separated by a form feed (\\f) in the text.
+    Documents with at least ``parallel_min_pages`` pages are split into page
+    ranges that ``workers`` processes extract in parallel. A page takes well
+    under a millisecond to extract and a round trip to the pool several, so
+    shorter documents are always extracted here.
+    """
+    doc = _open(source)
+    try:
+        page_count = doc.page_count
+        pages = min(page_count, max_pages) if max_pages else page_count
+
+        if workers > 1 and pages >= parallel_min_pages:
+            doc.close()
+            doc = None
+            chunk = -(-pages // workers)
+            pool = _get_pool(workers)
+            futures = [
+                pool.submit(_extract_page_range, source, start, min(start + chunk, pages), with_layout)
+                for start in range(0, pages, chunk)
+            ]
+            results = [page for future in futures for page in future.result()]
+        else:
+            results = []
+            chars = 0
+            for i in range(pages):
+                results.append(_extract_page(doc[i], i, with_layout))
+                chars += len(results[-1][0])
+                if max_chars and chars >= max_chars:
+                    break
+    finally:
+        if doc is not None:
+            doc.close()
+
+    texts = []
+    lines = []
+    blocks = []
+    chars = 0
+    truncated = len(results) < page_count
+    for text, page_lines, page_blocks in results:
+        if texts:
+            text = "\f" + text
+        if max_chars and chars + len(text) > max_chars:
+            texts.append(text[:max_chars - chars])
+            truncated = True
+            break
+        texts.append(text)
+        lines.extend(page_lines)
+        blocks.extend(page_blocks)
+        chars += len(text)
+
+    return PdfContent("".join(texts), lines, blocks, page_count, truncated)
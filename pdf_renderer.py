@@ -0,0 +1,221 @@
+import os
+import re
+import uuid
+import tempfile
+import threading
+from io import BytesIO
+from pipeline import Coalescer
+
+
+# A PDF renderer has render(html), which returns the PDF bytes or raises, and
+# preload(), which loads its engine now instead of on the first render. The app
+# uses whichever one PDF_RENDER_BACKEND selects.
+
+class WkhtmltopdfRenderer:
+    """Render HTML to PDF with wkhtmltopdf, sharing one process between concurrent requests
+
+    Starting wkhtmltopdf and WebKit is the biggest fixed cost of a render, and
+    wkhtmltopdf has no server mode to keep it warm. Instead, ``render`` calls
+    that arrive within ``max_wait`` seconds of each other are coalesced into a
+    single wkhtmltopdf run over up to ``max_batch`` documents. Each document
+    gets a unique <title>, which wkhtmltopdf turns into a top-level outline
+    entry, and the combined PDF is split back into one PDF per document at
+    those entries. If the combined run fails or can't be split, the documents
+    are rendered one at a time instead.
+
+    pdfkit and the wkhtmltopdf configuration (which checks the binary exists)
+    are only loaded on the first render.
+    """
+
+    def __init__(self, wkhtmltopdf, options, max_batch=8, max_wait=0.05, processes=2):
+        self.wkhtmltopdf = wkhtmltopdf
+        self.options = options
+        self.max_batch = max_batch
+        self._coalescer = Coalescer(self.render_many, max_batch=max_batch, max_wait=max_wait, workers=processes)
+        self._configuration = None
+
+    @property
+    def configuration(self):
+        if self._configuration is None:
+            import pdfkit
+            self._configuration = pdfkit.configuration(wkhtmltopdf=self.wkhtmltopdf)
+        return self._configuration
+
+    def preload(self):
+        self.configuration
+
+    def render(self, html):
+        """Render one HTML document and return the PDF bytes (raises if rendering fails)"""
+        if self.max_batch <= 1:
+            import pdfkit
+            return pdfkit.from_string(html, False, configuration=self.configuration, options=self.options)
+
+        pdf, error = self._coalescer.submit(html)
+        if error is not None:
+            raise RuntimeError(error)
+        return pdf
+
+    def render_many(self, htmls):
+        """Render several HTML documents and return a list of (pdf_bytes, error)"""
+        if len(htmls) == 1:
+            return [self._render_one(htmls[0])]
+        try:
+            return [(pdf, None) for pdf in self._render_combined(htmls)]
+        except Exception as e:
+            print(f"Combined render of {len(htmls)} documents failed, rendering separately: {str(e)}")
+            return [self._render_one(html) for html in htmls]
+
+    def _render_one(self, html):
+        import pdfkit
+        try:
+            return pdfkit.from_string(html, False, configuration=self.configuration, options=self.options), None
+        except Exception as e:
+            return None, str(e)
+
+    def _render_combined(self, htmls):
+        import pdfkit
+        batch_id = uuid.uuid4().hex
+        markers = [f"resume-boundary-{batch_id}-{i}" for i in range(len(htmls))]
+        options = dict(self.options)
+        options['outline'] = ''
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = []
+            for i, html in enumerate(htmls):
+                path = os.path.join(temp_dir, f"{i}.html")
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(_set_title(html, markers[i]))
+                paths.append(path)
+            combined = pdfkit.from_file(paths, False, configuration=self.configuration, options=options)
+
+        return split_pdf_at_outline(combined, markers)
+
+
+class StoryRenderer:
+    """Render HTML to PDF in-process with PyMuPDF's Story layout engine
+
+    There is no process to start per document. The images in
+    ``resource_dir`` and the fonts in ``font_dir`` are read once into an
+    in-memory archive that every render shares, and ``file:///`` links into
+    ``resource_dir`` are rewritten to point into it. Each font file is
+    declared with @font-face under its file name (Cambria.ttf serves
+    font-family "Cambria"); other families fall back to MuPDF's built-in
+    fonts. Pages are laid out like wkhtmltopdf's: CSS pixels at 96 dpi on
+    ``page_size`` with ``margin`` points around them. MuPDF supports a
+    subset of CSS, so output can differ from wkhtmltopdf's in details.
+    Content MuPDF can't split across pages (e.g. a table cell taller than a
+    page) and documents over ``max_pages`` pages raise ValueError.
+    """
+
+    IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+    FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc')
+
+    def __init__(self, resource_dir, font_dir=None, page_size="a4", margin=28.35, max_pages=50):
+        self.resource_dir = os.path.abspath(resource_dir).replace('\\', '/')
+        self.font_dir = font_dir
+        self.page_size = page_size
+        self.margin = margin
+        self.max_pages = max_pages
+        self._link_re = re.compile(r'file:/*' + re.escape(self.resource_dir.lstrip('/')) + '/', re.IGNORECASE)
+        # MuPDF isn't thread-safe, and the archive is shared by every render
+        self._lock = threading.Lock()
+        self._archive = None
+        self._css = ""
+
+    def preload(self):
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        if self._archive is not None:
+            return
+        import fitz
+        archive = fitz.Archive()
+        for name in sorted(os.listdir(self.resource_dir)):
+            if name.lower().endswith(self.IMAGE_EXTENSIONS):
+                with open(os.path.join(self.resource_dir, name), 'rb') as f:
+                    archive.add(f.read(), name)
+
+        css = []
+        if self.font_dir:
+            for name in sorted(os.listdir(self.font_dir)):
+                if name.lower().endswith(self.FONT_EXTENSIONS):
+                    with open(os.path.join(self.font_dir, name), 'rb') as f:
+                        archive.add(f.read(), name)
+                    family = os.path.splitext(name)[0]
+                    css.append(f'@font-face {{ font-family: "{family}"; src: url("{name}"); }}')
+        self._css = "\n".join(css)
+        self._archive = archive
+
+    def render(self, html):
+        """Render one HTML document and return the PDF bytes"""
+        import fitz
+        html = self._link_re.sub('', html)
+        page = fitz.paper_rect(self.page_size)
+        # Lay out in CSS pixels (0.75pt) and scale down while drawing, as wkhtmltopdf does
+        scale = 0.75
+        area = fitz.Rect(0, 0, (page.width - 2 * self.margin) / scale, (page.height - 2 * self.margin) / scale)
+        matrix = fitz.Matrix(scale, 0, 0, scale, self.margin, self.margin)
+
+        output = BytesIO()
+        with self._lock:
+            self._load()
+            story = fitz.Story(html=html, user_css=self._css or None, archive=self._archive)
+            writer = fitz.DocumentWriter(output)
+            try:
+                more, previous, pages = True, None, 0
+                while more:
+                    more, filled = story.place(area)
+                    filled = fitz.Rect(filled)
+                    # Content taller than a page that can't be split is placed again and again, spilling
+                    # far past the page (ordinary pages overshoot by a paragraph margin at most)
+                    if more and filled == previous and filled.y1 - area.y1 > area.height / 4:
+                        raise ValueError("The document has content taller than a page that can't be split "
+                                         "across pages (e.g. a long table cell)")
+                    pages += 1
+                    if self.max_pages and pages > self.max_pages:
+                        raise ValueError(f"The document is longer than {self.max_pages} pages")
+                    device = writer.begin_page(page)
+                    story.draw(device, matrix)
+                    writer.end_page()
+                    previous = filled
+            finally:
+                writer.close()
+        return output.getvalue()
+
+
+def _set_title(html, title):
+    """Replace (or add) the <title> of an HTML document"""
+    tag = f"<title>{title}</title>"
+    if re.search(r'<title\b[^>]*>.*?</title>', html, flags=re.IGNORECASE | re.DOTALL):
+        return re.sub(r'<title\b[^>]*>.*?</title>', lambda m: tag, html, count=1, flags=re.IGNORECASE | re.DOTALL)
+    if re.search(r'<head\b[^>]*>', html, flags=re.IGNORECASE):
+        return re.sub(r'(<head\b[^>]*>)', lambda m: m.group(1) + tag, html, count=1, flags=re.IGNORECASE)
+    return tag + html
+
+
+def split_pdf_at_outline(pdf_bytes, markers):
+    """Split a PDF into one PDF per marker, using top-level outline entries titled with the markers"""
+    import fitz
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        start_pages = {}
+        for level, title, page in doc.get_toc(simple=True):
+            title = title.strip()
+            if level == 1 and title in markers and title not in start_pages:
+                start_pages[title] = page - 1
+
+        starts = [start_pages.get(marker) for marker in markers]
+        if None in starts or starts[0] != 0 or any(b <= a for a, b in zip(starts, starts[1:])):
+            raise ValueError("Could not find every document in the combined PDF outline")
+
+        pdfs = []
+        ends = [start - 1 for start in starts[1:]] + [doc.page_count - 1]
+        for start, end in zip(starts, ends):
+            part = fitz.open()
+            part.insert_pdf(doc, from_page=start, to_page=end)
+            pdfs.append(part.tobytes(garbage=3, deflate=True))
+            part.close()
+        return pdfs
+    finally:
+        doc.close()
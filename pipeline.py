@@ -0,0 +1,213 @@
+import os
+import time
+import threading
+import queue
+from collections import namedtuple
+
+
+# A pipeline stage: ``func(value)`` returns ``(result, error)`` like the rest of
+# the resume helpers, and ``workers`` threads run it concurrently.
+Stage = namedtuple('Stage', ['name', 'func', 'workers'])
+
+_DONE = object()
+
+
+def _put(q, item, stop_event):
+    """Put an item on a bounded queue, giving up if the pipeline is stopped"""
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop_event):
+    """Get an item from a queue, returning _DONE if the pipeline is stopped"""
+    while not stop_event.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _run_stage(stage, in_q, out_q, stop_event, remaining, lock):
+    while True:
+        item = _get(in_q, stop_event)
+        if item is _DONE:
+            break
+
+        index, value, error = item
+        if error is None:
+            try:
+                value, error = stage.func(value)
+            except Exception as e:
+                value, error = None, f"Error processing resume: {str(e)}"
+
+        if not _put(out_q, (index, value, error), stop_event):
+            break
+
+    # The last worker of a stage to finish tells the next stage it is done
+    with lock:
+        remaining[0] -= 1
+        last = remaining[0] == 0
+    if last:
+        _put(out_q, _DONE, stop_event)
+    else:
+        _put(in_q, _DONE, stop_event)
+
+
+def run_pipeline(items, stages, queue_size=8):
+    """Run items through the stages concurrently and yield (index, result, error) in input order
+
+    Each stage has its own worker threads and a bounded input queue, so a slow
+    stage applies backpressure to the ones before it instead of buffering the
+    whole batch in memory. Once an item fails, later stages pass the error
+    through without running. Results are reordered so the caller sees them in
+    the same order as ``items``.
+    """
+    stop_event = threading.Event()
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in range(len(stages) + 1)]
+    threads = []
+
+    def feed():
+        for index, value in enumerate(items):
+            if not _put(queues[0], (index, value, None), stop_event):
+                return
+        _put(queues[0], _DONE, stop_event)
+
+    threads.append(threading.Thread(target=feed, name='pipeline-feed', daemon=True))
+    for i, stage in enumerate(stages):
+        workers = max(1, stage.workers)
+        remaining = [workers]
+        lock = threading.Lock()
+        for n in range(workers):
+            threads.append(threading.Thread(
+                target=_run_stage,
+                args=(stage, queues[i], queues[i + 1], stop_event, remaining, lock),
+                name=f'pipeline-{stage.name}-{n}',
+                daemon=True
+            ))
+
+    for thread in threads:
+        thread.start()
+
+    pending = {}
+    next_index = 0
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                break
+            pending[item[0]] = item
+            while next_index in pending:
+                yield pending.pop(next_index)
+                next_index += 1
+    finally:
+        stop_event.set()
+
+
+class _Call:
+    __slots__ = ('item', 'result', 'done')
+
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.done = threading.Event()
+
+
+class Coalescer:
+    """Group calls that arrive close together into batches for a single handler call
+
+    ``submit(item)`` blocks until ``handler(items)`` has processed the batch
+    the item ended up in, and returns that item's entry of the list the
+    handler returned. The handler returns a ``(result, error)`` tuple per
+    item; if it raises, or returns too few, the affected items get
+    ``(None, error message)``. A batch is closed after ``max_wait`` seconds, at
+    ``max_batch`` items, or when adding the next item would push the total
+    ``weight(item)`` over ``max_weight``. ``workers`` batches can be in the
+    handler at the same time.
+    """
+
+    def __init__(self, handler, max_batch=8, max_wait=0.05, workers=1, weight=None, max_weight=None):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.workers = workers
+        self.weight = weight
+        self.max_weight = max_weight
+        self._queue = queue.Queue()
+        self._threads = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._collect_lock = threading.Lock()
+        self._carry = None
+
+    def submit(self, item):
+        self._start()
+        call = _Call(item)
+        self._queue.put(call)
+        call.done.wait()
+        return call.result
+
+    def _start(self):
+        with self._start_lock:
+            # Threads don't survive a fork, so a new process gets its own dispatchers
+            if self._pid == os.getpid() and all(t.is_alive() for t in self._threads):
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            for n in range(max(1, self.workers)):
+                thread = threading.Thread(target=self._dispatch, name=f'coalescer-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _fits(self, batch, total, call):
+        if len(batch) >= self.max_batch:
+            return False
+        if self.max_weight and self.weight:
+            return total + self.weight(call.item) <= self.max_weight
+        return True
+
+    def _collect(self):
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+        batch = [first]
+        total = self.weight(first.item) if self.weight else 0
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                call = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if not self._fits(batch, total, call):
+                # Start the next batch with it rather than going over budget
+                self._carry = call
+                break
+            batch.append(call)
+            total += self.weight(call.item) if self.weight else 0
+        return batch
+
+    def _dispatch(self):
+        while True:
+            # One dispatcher collects at a time, so idle ones don't each take a single item
+            with self._collect_lock:
+                batch = self._collect()
+
+            try:
+                results = self.handler([call.item for call in batch])
+            except Exception as e:
+                results = [(None, str(e))] * len(batch)
+            if len(results) != len(batch):
+                # Callers without a result would otherwise wait forever
+                error = f"Batch handler returned {len(results)} results for {len(batch)} items"
+                print(error)
+                results = list(results[:len(batch)]) + [(None, error)] * (len(batch) - len(results))
+            for call, result in zip(batch, results):
+                call.result = result
+                call.done.set()
@@ -0,0 +1,206 @@
+import re
+import unicodedata
+from collections import namedtuple
+from heuristic_extractor import header_section
+
+
+# text is what goes into the prompt; tokens_* are estimates before and after preparing it
+PreparedText = namedtuple('PreparedText', ['text', 'tokens_before', 'tokens_after', 'truncated'])
+
+# Sections kept longest when the text is over budget, most important first.
+# "header" is the contact block before the first section header.
+SECTION_PRIORITY = ["header", "workExperience", "education", "skills", "projects", "summary", "achievements", "other"]
+
+# Lines kept in a section before it is dropped altogether
+MIN_SECTION_LINES = 2
+
+SPACE_RE = re.compile(r'[ \t\u00a0\u2000-\u200b\u3000]+')
+BULLET_RE = re.compile(r'^[\u2022\u25cf\u25aa\u25e6\u2023\u2219\u00b7\u25a0\u25a1\u27a2\u27a4\u25ba\u2713\u2714\u2756]\s*')
+HYPHENATED_RE = re.compile(r'[a-z]{2}-$')
+# Word endings that can't stand alone, so a line starting with one continues a word split by hyphenation
+# ("develop-" + "ment"); anything else may be a real compound ("self-" + "motivated") and keeps its hyphen
+SUFFIX_FRAGMENT_RE = re.compile(
+    r'^(?:ments?|tions?|sions?|ings?|ed|ances?|ences?|ity|ities|isms?|ists?|ives?|able|ible|ably|ibly|al|ally|'
+    r'ous|ers?|ors?|ness|ships?|ures?|ages?|ly|ical|ology|ogy|ics|ized?|ised?|izing|ising|ency|ancy|ful)\b'
+)
+# "3", "Page 3 of 4", "- 3 -"; only removed as a page's first or last line
+PAGE_NUMBER_RE = re.compile(r'^(?:-\s*)?(?:page\s*)?\d{1,3}(?:\s*(?:of|/)\s*\d{1,3})?(?:\s*-)?$', re.IGNORECASE)
+# A page number inside a header or footer line ("Jane Doe | Page 2 of 3")
+PAGE_REF_RE = re.compile(r'\bpage\s*\d{1,3}(?:\s*(?:of|/)\s*\d{1,3})?\b', re.IGNORECASE)
+BOILERPLATE_RE = re.compile(
+    r'^(?:curriculum vitae|r[eé]sum[eé]|cv|references?(?: are)?(?: available)? (?:up)?on request\.?|'
+    r'i hereby declare\b.*)$',
+    re.IGNORECASE
+)
+DECLARATION_RE = re.compile(r'^(?:declaration|references)\s*:?$', re.IGNORECASE)
+
+# Lines at the top and bottom of each page checked for repeated headers and footers
+EDGE_LINES = 3
+
+
+def estimate_tokens(text):
+    """Rough token count for budgeting (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def _clean_line(line):
+    line = SPACE_RE.sub(' ', unicodedata.normalize('NFKC', line)).strip()
+    return BULLET_RE.sub('- ', line)
+
+
+def _edge_key(line):
+    # Only page numbers differ between copies of a header or footer; other lines must match exactly,
+    # or every "2018 - 2019" at the edge of a page would look like the same footer
+    return PAGE_REF_RE.sub('page #', line.lower())
+
+
+def _edge_indexes(page, count):
+    """Indexes of the first and last ``count`` non-empty lines of a page"""
+    filled = [i for i, line in enumerate(page) if line]
+    return set(filled[:count] + filled[-count:])
+
+
+def _repeated_edges(pages):
+    """Keys of lines found at the top or bottom of at least half of the pages (and two or more)"""
+    if len(pages) < 2:
+        return set()
+    seen = {}
+    for page in pages:
+        for key in {_edge_key(page[i]) for i in _edge_indexes(page, EDGE_LINES) if not PAGE_NUMBER_RE.match(page[i])}:
+            seen[key] = seen.get(key, 0) + 1
+    threshold = max(2, (len(pages) + 1) // 2)
+    return {key for key, count in seen.items() if count >= threshold}
+
+
+def _page_lines(text):
+    pages = [[_clean_line(line) for line in page.splitlines()] for page in text.split('\f')]
+    repeated = _repeated_edges(pages)
+    # Page 1's header is usually the candidate's name and contacts, so its first copy stays
+    keep_once = {_edge_key(line) for line in [line for line in pages[0] if line][:EDGE_LINES]} & repeated
+    for page in pages:
+        edges = _edge_indexes(page, EDGE_LINES)
+        outer = _edge_indexes(page, 1)
+        for i, line in enumerate(page):
+            if i in outer and PAGE_NUMBER_RE.match(line):
+                continue
+            key = _edge_key(line) if i in edges else None
+            if key in repeated:
+                if key not in keep_once:
+                    continue
+                keep_once.discard(key)
+            yield line
+        yield ""
+
+
+def _join_hyphenated(lines):
+    pending = None
+    for line in lines:
+        if pending is not None:
+            if line[:1].islower():
+                word = pending.rsplit(None, 1)[-1]
+                if '-' not in word[:-1] and SUFFIX_FRAGMENT_RE.match(line):
+                    line = pending[:-1] + line
+                else:
+                    # Keep the hyphen of a compound ("state-of-the-" + "art"), only the line break goes
+                    line = pending + line
+            else:
+                yield pending
+            pending = None
+        if HYPHENATED_RE.search(line):
+            pending = line
+        else:
+            yield line
+    if pending is not None:
+        yield pending
+
+
+def _drop_boilerplate(lines):
+    skipping = False
+    for line in lines:
+        if DECLARATION_RE.match(line):
+            skipping = True
+            continue
+        if skipping and header_section(line) is None:
+            continue
+        skipping = False
+        if not BOILERPLATE_RE.match(line):
+            yield line
+
+
+def _collapse_blank_lines(lines):
+    blank = True
+    for line in lines:
+        if line:
+            yield line
+            blank = False
+        elif not blank:
+            yield line
+            blank = True
+
+
+def _sections(lines):
+    """Group lines into [section, header_line, body_lines] in document order"""
+    sections = [["header", None, []]]
+    for line in lines:
+        section = header_section(line) if line else None
+        if section is not None:
+            sections.append([section, line, []])
+        else:
+            sections[-1][2].append(line)
+    return sections
+
+
+def _line_tokens(line):
+    return estimate_tokens(line + "\n")
+
+
+def _fit_budget(sections, max_tokens):
+    """Trim the least important sections until the estimated tokens fit max_tokens"""
+    total = sum(_line_tokens(line) for _, header, body in sections for line in ([header] if header else []) + body)
+    if total <= max_tokens:
+        return False
+
+    def priority(section):
+        name = section[0]
+        return SECTION_PRIORITY.index(name) if name in SECTION_PRIORITY else len(SECTION_PRIORITY)
+
+    order = sorted(sections, key=priority, reverse=True)
+    # First shorten each section from the end, least important first
+    for section in order:
+        body = section[2]
+        while total > max_tokens and len(body) > MIN_SECTION_LINES:
+            total -= _line_tokens(body.pop())
+        if total <= max_tokens:
+            return True
+    # Then drop whole sections, keeping the contact block
+    for section in order:
+        if section[0] == "header":
+            continue
+        total -= sum(_line_tokens(line) for line in ([section[1]] if section[1] else []) + section[2])
+        section[1], section[2][:] = None, []
+        if total <= max_tokens:
+            return True
+    return True
+
+
+def prepare_prompt_text(text, max_tokens=None):
+    """Normalize resume text for the prompt and fit it into max_tokens
+
+    Repeated page headers and footers, page numbers and boilerplate
+    (declarations, "references on request") are dropped, whitespace is
+    collapsed and words hyphenated across lines are joined. If the result is
+    still over ``max_tokens``, the least important sections are shortened
+    from the end first (see SECTION_PRIORITY).
+    """
+    lines = _collapse_blank_lines(_drop_boilerplate(_join_hyphenated(_page_lines(text))))
+    truncated = False
+    if max_tokens:
+        sections = _sections(lines)
+        truncated = _fit_budget(sections, max_tokens)
+        lines = (line for _, header, body in sections for line in ([header] if header else []) + body)
+    prepared = "\n".join(lines).strip()
+    if max_tokens and estimate_tokens(prepared) > max_tokens:
+        # The contact block alone is over budget
+        prepared = prepared[:max_tokens * 4]
+        truncated = True
+    return PreparedText(prepared, estimate_tokens(text), estimate_tokens(prepared), truncated)
@@ -0,0 +1,125 @@
+import os
+import json
+import base64
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+
+
+# A validated template. ``source`` is the uploaded file's bytes and ``compiled``
+# is what gets rendered: a jinja2 Template for HTML or a DocxRenderer for DOCX.
+TemplateEntry = namedtuple('TemplateEntry', ['template_id', 'template_type', 'filename', 'source', 'compiled'])
+
+
+class TemplateRegistry:
+    """LRU of validated custom templates, keyed by a hash of their content
+
+    Compiled templates are kept in memory per process. With a ``folder``, the
+    sources of validated templates are also stored there (up to
+    ``max_stored``, least recently used removed first), so an id handed out
+    by one gunicorn worker works in every process sharing the folder: a
+    process that hasn't seen the template compiles it from disk with
+    ``compile(template_type, filename, source)``, which returns
+    ``(compiled, error)``. Without a folder, ids only work in the process
+    that registered them.
+    """
+
+    def __init__(self, max_entries=32, folder=None, compile=None, max_stored=1000):
+        self.max_entries = max_entries
+        self.folder = folder
+        self.compile = compile
+        self.max_stored = max_stored
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    @staticmethod
+    def make_id(template_type, source):
+        digest = hashlib.sha256()
+        digest.update(template_type.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(source)
+        return digest.hexdigest()
+
+    def get(self, template_id):
+        """Return the entry for template_id, or None if it isn't registered"""
+        with self._lock:
+            entry = self._entries.get(template_id)
+            if entry is not None:
+                self._entries.move_to_end(template_id)
+                return entry
+        entry = self._load(template_id)
+        if entry is not None:
+            self._remember(entry)
+        return entry
+
+    def add(self, template_type, filename, source, compiled=None):
+        """Register a validated template and return its entry"""
+        template_id = self.make_id(template_type, source)
+        entry = TemplateEntry(template_id, template_type, filename, source, compiled)
+        self._remember(entry)
+        self._store(entry)
+        return entry
+
+    def _remember(self, entry):
+        with self._lock:
+            self._entries[entry.template_id] = entry
+            self._entries.move_to_end(entry.template_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, template_id):
+        return os.path.join(self.folder, f"{template_id}.json")
+
+    def _store(self, entry):
+        if not self.folder:
+            return
+        record = {
+            "template_type": entry.template_type,
+            "filename": entry.filename,
+            "source": base64.b64encode(entry.source).decode('ascii'),
+        }
+        try:
+            # Write to a temporary file and rename it, so other processes never read half a template
+            fd, temp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(record, f)
+            os.replace(temp_path, self._path(entry.template_id))
+            self._prune()
+        except OSError as e:
+            print(f"Could not store template {entry.template_id}: {str(e)}")
+
+    def _load(self, template_id):
+        # Ids are hex digests; anything else can't be a stored template (or a safe file name)
+        if not self.folder or self.compile is None or not template_id or not all(c in '0123456789abcdef' for c in template_id):
+            return None
+        path = self._path(template_id)
+        try:
+            with open(path) as f:
+                record = json.load(f)
+            source = base64.b64decode(record["source"])
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        if self.make_id(record["template_type"], source) != template_id:
+            return None
+        compiled, error = self.compile(record["template_type"], record["filename"], source)
+        if error:
+            print(f"Stored template {template_id} no longer compiles: {error}")
+            return None
+        return TemplateEntry(template_id, record["template_type"], record["filename"], source, compiled)
+
+    def _prune(self):
+        if not self.max_stored:
+            return
+        paths = [os.path.join(self.folder, name) for name in os.listdir(self.folder) if name.endswith('.json')]
+        if len(paths) <= self.max_stored:
+            return
+        paths.sort(key=lambda path: os.path.getmtime(path))
+        for path in paths[:len(paths) - self.max_stored]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
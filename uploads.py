@@ -0,0 +1,123 @@
+import os
+import time
+import hashlib
+import tempfile
+
+
+class Upload:
+    """An uploaded resume, held in memory or in a temp file, with its SHA-256
+
+    ``source`` is what extract_pdf takes: the bytes for small uploads, or the
+    path of the spooled file for large ones. ``close()`` releases it, deleting
+    the temp file if this upload owns it.
+    """
+
+    def __init__(self, filename, sha256=None, size=0, data=None, path=None, owned=False):
+        self.filename = filename
+        self.sha256 = sha256
+        self.size = size
+        self.data = data
+        self.path = path
+        self.owned = owned
+
+    @classmethod
+    def from_path(cls, path, filename=None, chunk_size=64 * 1024):
+        """Wrap (and hash) a file that is already on disk; it isn't deleted on close"""
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+                size += len(chunk)
+        return cls(filename or os.path.basename(path), digest.hexdigest(), size, path=path)
+
+    @property
+    def source(self):
+        return self.data if self.data is not None else self.path
+
+    def close(self):
+        self.data = None
+        if self.owned and self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.owned = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def stream_size(file):
+    """Size of an uploaded FileStorage in bytes, without reading it"""
+    stream = file.stream
+    try:
+        position = stream.tell()
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return file.content_length or 0
+
+
+def spool_upload(file, folder, memory_limit=2 * 1024 * 1024, chunk_size=64 * 1024):
+    """Read an uploaded FileStorage into an Upload, hashing it as it streams
+
+    Files up to ``memory_limit`` bytes stay in memory. Larger ones are written
+    to a uniquely named temp file in ``folder`` as they are read, so
+    concurrent uploads with the same filename never collide.
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    spool = None
+    size = 0
+    try:
+        while True:
+            chunk = file.stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+            if spool is None and size > memory_limit:
+                spool = tempfile.NamedTemporaryFile(dir=folder, prefix="upload-", suffix=".pdf", delete=False)
+                spool.write(buffer)
+                buffer = None
+            if spool is not None:
+                spool.write(chunk)
+            else:
+                buffer += chunk
+    except BaseException:
+        if spool is not None:
+            spool.close()
+            os.remove(spool.name)
+        raise
+
+    if spool is not None:
+        spool.close()
+        return Upload(file.filename, digest.hexdigest(), size, path=spool.name, owned=True)
+    return Upload(file.filename, digest.hexdigest(), size, data=bytes(buffer))
+
+
+def close_uploads(uploads):
+    for upload in uploads:
+        upload.close()
+
+
+def purge_stale_uploads(folder, max_age=3600):
+    """Delete spooled upload files left behind by a crashed process"""
+    cutoff = time.time() - max_age
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(folder, name)
+        try:
+            if name.startswith("upload-") and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,39 @@
+import zipfile
+
+
+class _ChunkWriter:
+    """Write-only file object that collects bytes until they are taken by the stream
+
+    It deliberately has no seek/tell, which makes ZipFile write data
+    descriptors after each entry instead of seeking back to patch headers.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries, compression=zipfile.ZIP_DEFLATED):
+    """Yield a ZIP archive chunk by chunk, one chunk per (name, data) entry as it is produced"""
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, 'w', compression) as zip_file:
+        for name, data in entries:
+            zip_file.writestr(name, data)
+            chunk = writer.take()
+            if chunk:
+                yield chunk
+    # Closing the archive writes the central directory
+    chunk = writer.take()
+    if chunk:
+        yield chunk